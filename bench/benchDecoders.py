@@ -0,0 +1,73 @@
+from sys import path, argv
+path.insert(0,'..')
+from json import dumps, loads
+from time import perf_counter
+from simRRF import defaultModel, frequent
+
+'''
+    Compares the JSON decoders serialOM can use on M409 response lines.
+
+    By default the payloads are built from the simulated controller model, a
+    verbose and frequent response for each key plus a frequent root snapshot.
+    Responses captured from a real controller can be used instead by passing
+    a serialOM rawLog file, all JSON lines in it are decoded.
+
+    Decoders that are not installed are skipped.
+
+    $ cd bench
+    $ python benchDecoders.py [rawLog] [repeats]
+    (use '' for the rawLog to set repeats with the simulated payloads)
+'''
+
+def payloads():
+    # (name, line) pairs, in the format returned by the controller
+    model = defaultModel()
+    lines = []
+    for key, value in model.items():
+        for flags, result in (('vnd99', value), ('fnd99', frequent(value))):
+            lines.append((key + ' ' + flags[0], dumps({'key':key, 'flags':flags, 'result':result},
+                                                      separators=(',', ':')) + '\n'))
+    root = {k:frequent(v) for k,v in model.items()}
+    lines.append(('root f', dumps({'key':'', 'flags':'fnd99', 'result':root},
+                                  separators=(',', ':')) + '\n'))
+    return lines
+
+def captured(fileName):
+    # JSON response lines from a serialOM rawLog
+    lines = []
+    with open(fileName, 'r') as f:
+        for line in f:
+            if line[:1] == '{' and line[-2:] == '}\n':
+                try:
+                    key = loads(line).get('key', '?')
+                except ValueError:
+                    continue
+                lines.append((key, line))
+    return lines
+
+decoders = [('json', loads)]
+for name in ('ujson', 'orjson'):
+    try:
+        decoders.append((name, __import__(name).loads))
+    except ImportError:
+        print(name + ' is not installed, skipping')
+
+lines = captured(argv[1]) if len(argv) > 1 and argv[1] else payloads()
+repeats = int(argv[2]) if len(argv) > 2 else 2000
+
+print('%-14s %7s' % ('payload', 'bytes') + ''.join('%10s' % name for name, _ in decoders) + '   (us/decode)')
+totals = {name:0 for name, _ in decoders}
+size = 0
+for key, line in lines:
+    size += len(line)
+    row = '%-14s %7d' % (key[:14], len(line))
+    for name, decode in decoders:
+        begin = perf_counter()
+        for i in range(repeats):
+            decode(line)
+        elapsed = (perf_counter() - begin) / repeats
+        totals[name] += elapsed
+        row += '%10.1f' % (elapsed * 1e6)
+    print(row)
+print('%-14s %7d' % ('MB/s', size) + ''.join('%10.1f' % (size / totals[name] / 1e6)
+                                              for name, _ in decoders))
@@ -0,0 +1,38 @@
+from sys import path, argv
+path.insert(0,'..')
+from time import time
+from serialOM import serialOM
+from simRRF import simSerial
+
+'''
+    Compares the serialOM update strategies against the simulated controller.
+
+    For each link speed and key set a fresh serialOM is started and updated
+    a number of times with 'keys', 'snapshot' and 'auto' strategies, the mean
+    cycle time, requests and bytes recieved per cycle are reported.
+
+    $ cd bench
+    $ python benchStrategies.py [cycles]
+'''
+
+keySets = {'1 key':['network'],
+           '3 keys':['heat','tools','job'],
+           '5 keys':['heat','tools','job','boards','network'],
+           '7 keys':['heat','tools','job','boards','network','move','spindles']}
+links = ((57600, 5), (230400, 5), (2000000, 2))   # (baud, controller latency ms)
+cycles = int(argv[1]) if len(argv) > 1 else 20
+
+print('%-8s %-7s %-9s %9s %9s %9s' % ('baud', 'keys', 'strategy', 'ms/cycle', 'req/cycle', 'B/cycle'))
+for baud, latency in links:
+    for name, keys in keySets.items():
+        for strategy in ('keys', 'snapshot', 'auto'):
+            rrf = simSerial(baud=baud, latency=latency)
+            OM = serialOM(rrf, {'FFF':keys}, quiet=True, strategy=strategy)
+            OM.update()   # settle; verbose data and timings
+            writes, received = rrf.writes, rrf.bytesOut
+            begin = time()
+            for i in range(cycles):
+                OM.update()
+            elapsed = (time() - begin) * 1000 / cycles
+            print('%-8d %-7s %-9s %9.1f %9.1f %9d' % (baud, name, strategy, elapsed,
+                  (rrf.writes - writes) / cycles, (rrf.bytesOut - received) / cycles))
@@ -0,0 +1,120 @@
+from sys import path
+from os import remove
+from json import dumps, loads
+from importlib.util import spec_from_file_location, module_from_spec
+from tempfile import mkdtemp
+path.insert(0,'..')
+path.insert(1,'../printPy')
+from serialOM import serialOM
+from simRRF import simSerial
+from omTracker import omTracker
+from outputTXT import outputRRF
+from omJournal import omJournal, omJournalReader
+
+'''
+    Behaviour checks for serialOM, against the simulated controller.
+
+    Each check prints 'ok' or raises an AssertionError with the details.
+
+    $ cd bench
+    $ python checks.py
+'''
+
+def checkLazySnapshot():
+    # lazy keys stay undecoded through root level snapshot updates
+    for strategy in ('snapshot', 'auto', 'keys'):
+        rrf = simSerial(baud=2000000, latency=0)
+        OM = serialOM(rrf, {'FFF':['heat','tools','job','boards','move']}, quiet=True,
+                      strategy=strategy, lazyKeys=['boards','move'])
+        rrf.model['boards'][0]['vIn']['current'] = 23.1
+        OM.update()
+        assert sorted(OM.model.pending) == ['boards','move'], strategy + ': ' + str(OM.model.pending)
+        assert OM.model.decodes == 0, strategy + ': ' + str(OM.model.decodes) + ' decodes'
+        # the latest frequent data is merged when the key is read
+        assert OM.model['boards'][0]['vIn']['current'] == 23.1, strategy
+        assert OM.model.decodes == 1, strategy
+    print('lazy keys and snapshots: ok')
+
+def checkTrackerReport():
+    # the access report for the printPy text output class
+    out = outputRRF()
+    tracker = omTracker()
+    OM = serialOM(simSerial(baud=2000000, latency=0), out.omKeys, quiet=True)
+    out.showStatus(tracker.wrap(OM.model, OM.machineMode))
+    out.update(tracker.wrap(OM.model, OM.machineMode))
+    report = tracker.report()
+    assert report['omKeys']['FFF'] == ['boards','heat','job','network','tools'], report['omKeys']
+    fields = report['fields']['FFF']
+    assert '[].vIn.current' in fields['boards'], fields['boards']
+    assert fields['tools'] == ['[].heaters[]'], fields['tools']
+    assert 'heaters[].current' in fields['heat'], fields['heat']
+    # list valued keys have no name before their first '[]'
+    depth = report['depth']['FFF']
+    assert depth == {'boards':3, 'heat':3, 'job':2, 'network':3, 'state':1, 'tools':3}, depth
+    print('access tracker report: ok')
+
+def checkJournal():
+    # changes from an update that was not recorded are written by the next record()
+    rrf = simSerial(baud=2000000, latency=0)
+    OM = serialOM(rrf, {'FFF':['heat','tools','job','boards']}, quiet=True)
+    fileName = mkdtemp() + '/checks.jsonl'
+    journal = omJournal(OM, fileName)
+    journal.record()
+    # not recorded, as printPy did when update() returned False
+    rrf.model['boards'][0]['vIn']['current'] = 23.1
+    OM.update()
+    rrf.model['heat']['heaters'][1]['current'] = 199.5
+    OM.update()
+    assert OM.changed == ['heat'], OM.changed
+    journal.record()
+    journal.close()
+    reader = omJournalReader(fileName)
+    model = None
+    for t, model in reader.replay():
+        pass
+    expected = loads(dumps(OM.model))
+    assert model == expected, [key for key in expected if model.get(key) != expected[key]]
+    remove(fileName)
+    remove(fileName + '.idx')
+    print('journal records skipped updates: ok')
+
+def checkProfiles():
+    # the bundled text outputs render under each of their polling profiles,
+    # starting in that status and after changing to it
+    spec = spec_from_file_location('outputMPy', '../printMPy/outputTXT.py')
+    outputMPy = module_from_spec(spec)
+    spec.loader.exec_module(outputMPy)
+    for outputClass in (outputRRF, outputMPy.outputRRF):
+        statuses = list(outputClass.omProfiles) + ['processing']
+        for mode in ('FFF', 'CNC', 'Laser'):
+            for first in statuses:
+                for status in statuses:
+                    rrf = simSerial(baud=2000000, latency=0)
+                    rrf.model['state']['machineMode'] = mode
+                    rrf.model['state']['status'] = first
+                    out = outputClass()
+                    OM = serialOM(rrf, out.omKeys, quiet=True, profiles=out.omProfiles)
+                    out.showStatus(OM.model)
+                    rrf.model['state']['status'] = status
+                    OM.update()
+                    text = out.update(OM.model)
+                    assert ('status: ' + status) in text, (mode, first, status, text)
+    print('output profiles: ok')
+
+def checkIndexes():
+    # the text output shows the same heaters with and without the serialOM indexes
+    rrf = simSerial(baud=2000000, latency=0)
+    out = outputRRF()
+    OM = serialOM(rrf, out.omKeys, quiet=True)
+    walked = out.update(OM.model)
+    indexed = out.update(OM.model, indexes=OM.indexes)
+    assert indexed == walked, (walked, indexed)
+    assert ' | bed: ' in indexed and ' | e0: ' in indexed, indexed
+    print('output indexes: ok')
+
+
+checkLazySnapshot()
+checkTrackerReport()
+checkJournal()
+checkProfiles()
+checkIndexes()
@@ -0,0 +1,207 @@
+from json import dumps
+from time import sleep,time
+
+'''
+    A simulated RRF controller for benchmarking serialOM without hardware.
+
+    simSerial() mimics the parts of a PySerial object that serialOM uses;
+    write(), readline(), in_waiting, reset_input_buffer() and the timeout properties.
+    Commands are answered from a canned ObjectModel, responses become
+    'readable' after a fixed latency plus the time needed to transfer them
+    at the simulated baud rate.
+
+    Only M115 and M409 are understood, anything else gets an 'ok'.
+'''
+
+def _heater(current, active, state):
+    return {'active':active, 'avgPwm':0.5, 'current':current,
+            'max':285, 'maxBadReadings':3, 'maxHeatingFaultTime':5,
+            'maxTempExcursion':15, 'min':-10, 'monitors':[
+                {'action':0, 'condition':'tooHigh', 'limit':285},
+                {'condition':'disabled'}, {'condition':'disabled'}],
+            'model':{'coolingExp':1.4, 'coolingRate':0.56,
+                     'deadTime':5.5, 'enabled':True, 'fanCoolingRate':0,
+                     'heatingRate':2.43, 'inverted':False,
+                     'maxPwm':1, 'pid':{'d':1.2, 'i':0.01, 'overridden':False,
+                                        'p':0.3, 'used':True},
+                     'standardVoltage':24.1},
+            'sensor':1, 'standby':0, 'state':state}
+
+def _axis(letter, position):
+    return {'acceleration':1000, 'babystep':0, 'backlash':0,
+            'current':800, 'drivers':['0.' + str('XYZ'.index(letter))],
+            'homed':True, 'jerk':900, 'letter':letter,
+            'machinePosition':position, 'max':200, 'maxProbed':False,
+            'microstepping':{'interpolated':True, 'value':16},
+            'min':0, 'minProbed':False, 'percentCurrent':100,
+            'percentStstCurrent':None, 'speed':6000, 'stepsPerMm':80,
+            'userPosition':position, 'visible':True,
+            'workplaceOffsets':[0, 0, 0, 0, 0, 0, 0, 0, 0]}
+
+def defaultModel():
+    # A plausible Duet 2 WiFi FFF model, trimmed to the keys printPy uses
+    return {
+        'boards':[{'firmwareDate':'2023-07-21', 'firmwareFileName':'Duet2CombinedFirmware.bin',
+                   'firmwareName':'RepRapFirmware for Duet 2 WiFi/Ethernet',
+                   'firmwareVersion':'3.4.6', 'iapFileNameSD':'Duet2_SDiap32_WiFiEth.bin',
+                   'maxHeaters':10, 'maxMotors':12, 'mcuTemp':{'current':41.0, 'max':42.5, 'min':38.9},
+                   'name':'Duet 2 WiFi', 'shortName':'2WiFi', 'state':'running',
+                   'supports12864':True, 'supportsDirectDisplay':False,
+                   'vIn':{'current':23.8, 'max':24.1, 'min':23.5}}],
+        'heat':{'bedHeaters':[0, -1, -1, -1], 'chamberHeaters':[-1, -1, -1, -1],
+                'coldExtrudeTemperature':160, 'coldRetractTemperature':90,
+                'heaters':[_heater(100.1, 100, 'active'), _heater(280.2, 280, 'active')]},
+        'job':{'build':{'currentObject':0, 'm486Names':False, 'm486Numbers':False,
+                        'objects':[{'cancelled':False, 'name':'part'}]},
+               'duration':1200, 'file':{'fileName':'0:/gcodes/part.gcode',
+                                        'size':1048576, 'numLayers':120},
+               'filePosition':524288, 'lastFileName':None, 'layer':60,
+               'layerTime':12.5, 'timesLeft':{'filament':600, 'file':620, 'slicer':590}},
+        'move':{'axes':[_axis('X', 10.0), _axis('Y', 20.0), _axis('Z', 0.3)],
+                'currentMove':{'acceleration':1000, 'deceleration':1000,
+                               'laserPwm':None, 'requestedSpeed':50, 'topSpeed':50},
+                'workplaceNumber':0},
+        'network':{'hostname':'duet', 'interfaces':[
+                       {'actualIP':'10.0.0.30', 'firmwareVersion':'1.27', 'gateway':'10.0.0.1',
+                        'mac':'60:01:94:00:00:00', 'signal':-60, 'state':'active',
+                        'subnet':'255.255.255.0', 'type':'wifi'}],
+                   'name':'Duet'},
+        'spindles':[],
+        'state':{'atxPower':None, 'beep':None, 'currentTool':0, 'displayMessage':'',
+                 'gpOut':[], 'laserPwm':None, 'logFile':None, 'logLevel':'off',
+                 'machineMode':'FFF', 'messageBox':None, 'msUpTime':123,
+                 'nextTool':0, 'powerFailScript':'', 'previousTool':-1,
+                 'status':'processing', 'time':'2024-02-29T01:02:54', 'upTime':31557},
+        'tools':[{'active':[280], 'axes':[[0], [1]], 'extruders':[0], 'fans':[0],
+                  'filamentExtruder':0, 'heaters':[1], 'mix':[1], 'name':'',
+                  'number':0, 'offsets':[0, 0, 0], 'spindle':-1, 'spindleRpm':0,
+                  'standby':[0], 'state':'active'}],
+    }
+
+# Fields returned by 'f'requent requests, everything else is verbose only
+FREQUENT = ('current', 'active', 'standby', 'state', 'status', 'upTime', 'msUpTime',
+            'machinePosition', 'userPosition', 'filePosition', 'duration', 'layer',
+            'layerTime', 'timesLeft', 'file', 'filament', 'slicer', 'vIn', 'mcuTemp',
+            'min', 'max', 'displayMessage', 'messageBox', 'currentTool', 'time',
+            'heaters', 'axes', 'interfaces', 'actualIP', 'signal', 'build',
+            'currentObject', 'laserPwm', 'currentMove', 'topSpeed', 'avgPwm')
+
+def frequent(value):
+    # Reduce a model value to the frequently changing fields
+    if isinstance(value, dict):
+        return {k:frequent(v) for k,v in value.items() if k in FREQUENT}
+    if isinstance(value, list):
+        return [frequent(v) for v in value]
+    return value
+
+
+class simSerial:
+    '''
+        init arguments:
+            model:      dict; the ObjectModel to serve, default: defaultModel()
+            baud:       int; simulated link speed in baud, default: 57600
+            latency:    int; controller processing time per request in ms, default: 5
+            name:       str; device name, default: 'sim'
+
+        properties:
+            writes:     number of commands recieved
+            bytesOut:   number of bytes sent back to the host
+            model:      the model being served, may be modified between requests
+    '''
+    def __init__(self, model=None, baud=57600, latency=5, name='sim'):
+        self.model = model if model is not None else defaultModel()
+        self.baudrate = baud
+        self.latency = latency
+        self.name = name
+        self.timeout = 0.025
+        self.write_timeout = 0.025
+        self.is_open = True
+        self.writes = 0
+        self.bytesOut = 0
+        self.seqs = {key:1 for key in self.model}
+        self._queue = []   # list of [startTime, bytes]
+
+    def _reply(self, lines):
+        # queue response lines, bytes become readable as they are 'transmitted'
+        start = time() + self.latency / 1000
+        if self._queue:
+            start = max(start, self._queue[-1][0] + len(self._queue[-1][1]) * 10 / self.baudrate)
+        for line in lines:
+            data = line.encode('ascii')
+            self._queue.append([start, data])
+            start += len(data) * 10 / self.baudrate
+            self.bytesOut += len(data)
+
+    def _arrived(self):
+        # number of bytes of the first queued line that have arrived
+        start, data = self._queue[0]
+        return min(len(data), int((time() - start) * self.baudrate / 10))
+
+    def write(self, data):
+        self.writes += 1
+        code = bytes(data).decode('ascii').strip()
+        if code.startswith('M115'):
+            self._reply(['FIRMWARE_NAME: RepRapFirmware for Duet 2 WiFi/Ethernet '
+                         'FIRMWARE_VERSION: 3.4.6 ELECTRONICS: Duet WiFi 1.02 or later '
+                         'FIRMWARE_DATE: 2023-07-21 14:08:28\n', 'ok\n'])
+        elif code.startswith('M409'):
+            flags = code.split('F"')[1].split('"')[0]
+            key = code.split('K"')[1].split('"')[0] if 'K"' in code else ''
+            if key == 'seqs':
+                result = self.seqs
+            elif key == '':
+                result = {k:(frequent(v) if 'f' in flags else v) for k,v in self.model.items()}
+                result['seqs'] = self.seqs
+            elif key in self.model:
+                value = self.model[key]
+                result = frequent(value) if 'f' in flags else value
+            else:
+                result = None
+            self._reply([dumps({'key':key, 'flags':flags, 'result':result},
+                               separators=(',', ':')) + '\n'])
+        else:
+            self._reply(['ok\n'])
+        return len(data)
+
+    def readline(self):
+        # like PySerial; returns a complete line, or whatever arrived before the timeout
+        deadline = time() + self.timeout
+        while True:
+            if self._queue and self._arrived() == len(self._queue[0][1]):
+                return self._queue.pop(0)[1]
+            if time() >= deadline:
+                if not self._queue or self._arrived() <= 0:
+                    return b''
+                # partial line, the rest follows later
+                count = self._arrived()
+                start, data = self._queue[0]
+                self._queue[0] = [start + count * 10 / self.baudrate, data[count:]]
+                return data[:count]
+            sleep(0.0005)
+
+    @property
+    def in_waiting(self):
+        # bytes that have arrived but not yet been read
+        count = 0
+        for start, data in self._queue:
+            arrived = min(len(data), int((time() - start) * self.baudrate / 10))
+            if arrived <= 0:
+                break
+            count += arrived
+        return count
+
+    def reset_input_buffer(self):
+        # discard everything that has already arrived
+        while self._queue and self._arrived() > 0:
+            count = self._arrived()
+            start, data = self._queue[0]
+            if count == len(data):
+                self._queue.pop(0)
+            else:
+                self._queue[0] = [start + count * 10 / self.baudrate, data[count:]]
+
+    def close(self):
+        self.is_open = False
+
+    def open(self):
+        self.is_open = True
@@ -0,0 +1,284 @@
+from sys import argv
+import re
+import numpy as np
+from omRecorder import readRecordings
+
+'''
+    Offline analysis of recorded serialOM telemetry, needs NumPy (CPython only).
+
+    Whole runs are loaded into NumPy arrays and analysed with vectorised
+    operations, there are no per-sample Python loops:
+        heaters:    for each setpoint; overshoot, settling time, and the ripple
+                    (peak to peak) and standard deviation once settled
+        throughput: jobs seen, bytes (or %) advanced, printing time and rate
+        vIn sags:   periods where the input voltage drops below nominal
+        latency:    distribution of the time between poll cycles
+
+    Data can come from omRecorder files ('.omr'), or from the timestamped text
+    log written by the printPy outputTXT class (config.outputLog). Text logs
+    have one second timestamps and only show the values that are displayed,
+    recordings are more precise. The serialOM rawLog has no timestamps, so
+    cannot be used.
+
+    Recordings are analysed using these columns, when present:
+        heat.heaters[n].current with heat.heaters[n].active  (the setpoint)
+        job.filePosition
+        boards[n].vIn.current
+    Record the heater 'active' values along with 'current' for the heater results.
+
+    $ python omAnalysis.py telemetry-*.omr
+    $ python omAnalysis.py printPy.log
+'''
+
+# text log fields; '[1700000000] status: processing | ... | bed: 60.1 (60.0) | e0: 210.3 (210.0)'
+_lineRegex = r'^\[(\d+)\] '
+_heaterNames = re.compile(r'\| (bed|chamber|e\d+): ')
+
+def _textField(fileName, field, target=False):
+    # one row per log entry, empty strings where the field is not shown
+    # entries can continue on following lines that start with a space
+    regex = re.compile(_lineRegex + r'(?:(?:[^\n]|\n )*?' + field + r')?', re.M)
+    dtype = [('time', 'i8'), ('value', 'U32')]
+    if target:
+        dtype.append(('target', 'U32'))
+    return np.fromregex(fileName, regex, dtype)
+
+def _numbers(strings):
+    # strings to floats, NaN where empty or not a number (eg: 'FAULT')
+    numeric = np.char.isdigit(np.char.replace(np.char.replace(strings, '.', ''), '-', ''))
+    return np.where(numeric, strings, 'nan').astype('f8')
+
+def _floats(values):
+    # columns as floats, with the integer 'missing' value as NaN
+    if values.dtype.kind == 'i':
+        missing = values == np.iinfo(values.dtype).min
+        values = values.astype('f8')
+        values[missing] = np.nan
+    return values.astype('f8')
+
+def loadTextLog(fileName):
+    '''
+        Loads a printPy output log; returns a dict of arrays, {column:values}
+        Columns are 'time' (ms), 'progress' (%), 'vIn', and for each heater shown
+        (bed, chamber, e0..) 'name.current' and 'name.active'.
+    '''
+    with open(fileName, 'r') as f:
+        names = sorted(set(_heaterNames.findall(f.read())))
+    rows = np.fromregex(fileName, re.compile(_lineRegex, re.M), [('time', 'i8')])
+    data = {'time':rows['time'] * 1000}
+    data['progress'] = _numbers(_textField(fileName, r'\| progress: ([-\d.]+)%')['value'])
+    data['vIn'] = _numbers(_textField(fileName, r'Vin: ([-\d.]+)V')['value'])
+    for name in names:
+        fields = _textField(fileName, r'\| ' + name + r': ([-\d.]+|FAULT)(?: \(([-\d.]+)\))?', True)
+        data[name + '.current'] = _numbers(fields['value'])
+        data[name + '.active'] = _numbers(fields['target'])
+    return data
+
+def load(fileNames, start=None, end=None):
+    '''
+        Loads recordings and/or text logs, returns a dict of arrays joined in
+        time order. 'start' and 'end' optionally limit the time range (ms).
+    '''
+    recordings = [name for name in fileNames if name.endswith('.omr')]
+    parts = [readRecordings(recordings, start=start, end=end)] if recordings else []
+    parts += [loadTextLog(name) for name in fileNames if not name.endswith('.omr')]
+    names = []
+    for part in parts:
+        names += [name for name in part if name not in names]
+    data = {}
+    for name in names:
+        data[name] = np.concatenate([_floats(part[name]) if name in part and name != 'time'
+                                     else part[name] if name in part
+                                     else np.full(len(part['time']), np.nan)
+                                     for part in parts]) if parts else np.array([])
+    if not parts:
+        return data
+    order = np.argsort(data['time'], kind='stable')
+    data = {name:values[order] for name, values in data.items()}
+    if start is not None or end is not None:
+        keep = np.ones(len(data['time']), dtype=bool)
+        if start is not None:
+            keep &= data['time'] >= start
+        if end is not None:
+            keep &= data['time'] <= end
+        data = {name:values[keep] for name, values in data.items()}
+    return data
+
+
+def heaterStability(time, current, target, band=2.0):
+    '''
+        Splits a heater run at each setpoint change, and returns a list with a
+        result for each (non zero) setpoint:
+          {'start':ms, 'target':C, 'overshoot':C, 'settling':s or None, 'ripple':C, 'std':C}
+        'settling' is the time until the temperature stays within 'band' of the
+        target; 'ripple' (peak to peak) and 'std' are measured after that, they
+        are NaN if it never settled.
+    '''
+    current = _floats(current)
+    target = _floats(target)
+    # samples without a temperature are skipped, no setpoint is 'off'
+    shown = np.isfinite(current)
+    time = time[shown]
+    current = current[shown]
+    target = np.nan_to_num(target[shown])
+    count = len(time)
+    if count == 0:
+        return []
+    index = np.arange(count)
+    # segments of constant setpoint
+    change = np.flatnonzero(np.diff(target) != 0) + 1
+    starts = np.r_[0, change]
+    ends = np.r_[change, count]
+    segment = np.repeat(np.arange(len(starts)), ends - starts)
+    setpoint = target[starts]
+    heating = current[starts] < setpoint
+    overshoot = np.where(heating, np.fmax.reduceat(current, starts) - setpoint,
+                         setpoint - np.fmin.reduceat(current, starts))
+    # settled after the last sample outside the band
+    outside = np.abs(current - target) > band
+    lastOut = np.maximum.reduceat(np.where(outside, index, -1), starts)
+    settledAt = np.maximum(lastOut + 1, starts)
+    settled = settledAt < ends
+    settling = (time[np.minimum(settledAt, count - 1)] - time[starts]) / 1000
+    # after settling
+    after = index >= settledAt[segment]
+    values = np.where(after, current, np.nan)
+    ripple = np.fmax.reduceat(values, starts) - np.fmin.reduceat(values, starts)
+    n = np.add.reduceat(after.astype('i8'), starts)
+    total = np.add.reduceat(np.where(after, current, 0), starts)
+    squares = np.add.reduceat(np.where(after, current, 0) ** 2, starts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / n
+        std = np.sqrt(np.maximum(squares / n - mean ** 2, 0))
+    wanted = np.isfinite(setpoint) & (setpoint > 0) & (ends - starts > 1)
+    return [{'start':int(time[starts[i]]), 'target':float(setpoint[i]),
+             'overshoot':max(float(overshoot[i]), 0.0),
+             'settling':float(settling[i]) if settled[i] else None,
+             'ripple':float(ripple[i]), 'std':float(std[i])}
+            for i in np.flatnonzero(wanted)]
+
+def throughput(time, position):
+    '''
+        Job progress from the job.filePosition (or progress %) column:
+          {'jobs':n, 'advanced':total, 'active':s, 'rate':per second}
+        A fall in position starts a new job, 'active' is the time spent advancing.
+    '''
+    position = _floats(position)
+    valid = np.isfinite(position)
+    time = time[valid]
+    position = position[valid]
+    if len(position) < 2:
+        return {'jobs':0, 'advanced':0.0, 'active':0.0, 'rate':None}
+    step = np.diff(position)
+    seconds = np.diff(time) / 1000
+    advancing = step > 0
+    job = np.cumsum(step < 0)
+    active = float(seconds[advancing].sum())
+    advanced = float(step[advancing].sum())
+    return {'jobs':len(np.unique(job[advancing])), 'advanced':advanced, 'active':active,
+            'rate':advanced / active if active else None}
+
+def sagEvents(time, volts, drop=0.05, nominal=None):
+    '''
+        Finds periods where the voltage is more than 'drop' (a fraction) below
+        'nominal' (default: the median). Returns a list of:
+          {'start':ms, 'duration':s, 'min':V}
+    '''
+    volts = _floats(volts)
+    valid = np.isfinite(volts)
+    time = time[valid]
+    volts = volts[valid]
+    if len(volts) == 0:
+        return []
+    if nominal is None:
+        nominal = float(np.median(volts))
+    below = (volts < nominal * (1 - drop)).astype('i1')
+    edges = np.diff(np.r_[0, below, 0])
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    if len(starts) == 0:
+        return []
+    lowest = np.minimum.reduceat(np.where(below, volts, np.inf), starts)
+    # the sag lasts until the first sample back above the threshold
+    duration = (time[np.minimum(ends, len(time) - 1)] - time[starts]) / 1000
+    return [{'start':int(time[s]), 'duration':float(d), 'min':float(v)}
+            for s, d, v in zip(starts, duration, lowest)]
+
+def cycleLatency(time, percentiles=(50, 90, 99)):
+    '''
+        Distribution of the time between samples (poll cycles) in ms:
+          {'cycles':n, 'mean':ms, 'p50':ms, .., 'max':ms}
+        Gaps longer than a minute (restarts, files joined) are ignored.
+    '''
+    gaps = np.diff(time)
+    gaps = gaps[(gaps > 0) & (gaps < 60000)]
+    if len(gaps) == 0:
+        return {'cycles':0}
+    result = {'cycles':len(gaps), 'mean':float(gaps.mean())}
+    for p, value in zip(percentiles, np.percentile(gaps, percentiles)):
+        result['p' + str(p)] = float(value)
+    result['max'] = float(gaps.max())
+    return result
+
+def analyse(data, band=2.0, drop=0.05):
+    '''
+        Runs all of the analyses on loaded data (see load()), using the columns
+        that are present. Returns a dict:
+          {'samples':n, 'heaters':{name:[..]}, 'throughput':{..},
+           'sags':{name:[..]}, 'latency':{..}}
+    '''
+    time = data.get('time', np.array([], dtype='i8'))
+    report = {'samples':len(time), 'heaters':{}, 'sags':{}}
+    for name in data:
+        if name.endswith('.current'):
+            base = name[:-len('.current')]
+            if base + '.active' in data:
+                report['heaters'][base] = heaterStability(time, data[name], data[base + '.active'], band)
+            elif 'vIn' in base:
+                report['sags'][name] = sagEvents(time, data[name], drop)
+    if 'vIn' in data:
+        report['sags']['vIn'] = sagEvents(time, data['vIn'], drop)
+    for name in ('job.filePosition', 'progress'):
+        if name in data:
+            report['throughput'] = throughput(time, data[name])
+            report['throughput']['column'] = name
+            break
+    report['latency'] = cycleLatency(time)
+    return report
+
+def _format(value):
+    if value is None:
+        return '-'
+    if isinstance(value, float):
+        return '%.2f' % value
+    return str(value)
+
+def printReport(report):
+    '''
+        Prints a report from analyse() as text
+    '''
+    print('samples: ' + str(report['samples']))
+    for name, runs in report['heaters'].items():
+        print('heater ' + name + ': ' + str(len(runs)) + ' setpoints')
+        for run in runs:
+            print('  target: ' + _format(run['target']) + ' | overshoot: ' + _format(run['overshoot'])
+                  + ' | settling: ' + _format(run['settling']) + 's | ripple: '
+                  + _format(run['ripple']) + ' | std: ' + _format(run['std']))
+    if 'throughput' in report:
+        t = report['throughput']
+        print('throughput (' + t['column'] + '): jobs: ' + str(t['jobs']) + ' | advanced: '
+              + _format(t['advanced']) + ' | active: ' + _format(t['active']) + 's | rate: '
+              + _format(t['rate']) + '/s')
+    for name, events in report['sags'].items():
+        print('sags ' + name + ': ' + str(len(events)) + ' events'
+              + (' | lowest: ' + _format(min(e['min'] for e in events)) + 'V'
+                 + ' | longest: ' + _format(max(e['duration'] for e in events)) + 's' if events else ''))
+    latency = report['latency']
+    print('cycle latency (ms): ' + ' | '.join(k + ': ' + _format(v) for k, v in latency.items()))
+
+
+if __name__ == '__main__':
+    if len(argv) < 2:
+        print('usage: python omAnalysis.py file [file..]  (.omr recordings or printPy text logs)')
+    else:
+        printReport(analyse(load(argv[1:])))
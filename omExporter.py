@@ -0,0 +1,159 @@
+from threading import Thread
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from serialOM import omPath
+
+'''
+    OpenMetrics/Prometheus exporter for serialOM (CPython only).
+
+    Serves selected numeric values from the ObjectModel, plus serialOM's
+    own request statistics, over a local HTTP endpoint at '/metrics'.
+
+    The metrics text is pre-rendered by refresh(), which the host loop calls
+    after each OM.update(). HTTP scrapes are answered from that cache by a
+    background thread, they never touch the serial port or the model.
+'''
+
+class omExporter:
+    '''
+        init arguments:
+            OM:         serialOM object, required
+            paths:      list of model paths to export, required, eg:
+                          ['heat.heaters[*].current','heat.heaters[*].active',
+                           'job.filePosition','boards[0].vIn.current']
+            port:       int; TCP port to listen on, default: 9101
+            host:       str; address to bind to, default: '127.0.0.1' (local only)
+            prefix:     str; prefix for the model metric names, default: 'rrf'
+
+            Metric names are built from the path, list indexes become labels
+            named after the list, eg: 'heat.heaters[1].current' is exported as
+            'rrf_heat_heaters_current{heaters="1"}'.
+            Booleans are exported as 1/0, non-numeric and missing values are skipped.
+
+        methods:
+            refresh():      Re-renders the cached metrics if anything changed.
+                            Call this from the main loop after OM.update()
+            stop():         Shuts down the HTTP server
+
+        properties:
+            renders:        Number of times the metrics text has been rendered
+    '''
+
+    def __init__(self, OM, paths, port=9101, host='127.0.0.1', prefix='rrf'):
+        self._OM = OM
+        # group paths into metric families, paths that only differ by index share a name
+        self._families = {}
+        for path in paths:
+            path = omPath(path)
+            name = prefix + '_' + '_'.join(s for s in path.steps if isinstance(s, str) and s != '*')
+            self._families.setdefault(name, []).append(path)
+        self._last = None
+        self._version = None
+        self._samples = ()
+        self._text = b'# EOF\n'
+        self._openMetrics = b'# EOF\n'
+        self.renders = 0
+        self.refresh()
+        exporter = self
+
+        class handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                if 'application/openmetrics-text' in self.headers.get('Accept', ''):
+                    body = exporter._openMetrics
+                    ctype = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+                else:
+                    body = exporter._text
+                    ctype = 'text/plain; version=0.0.4; charset=utf-8'
+                self.send_response(200)
+                self.send_header('Content-Type', ctype)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                # scrapes are frequent, do not spam the console
+                pass
+
+        self._server = HTTPServer((host, port), handler)
+        self._thread = Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def _sample(self):
+        # Collect the current values for all paths, plus the serialOM stats
+        # the model is only walked again when it's version has changed
+        if self._OM.version != self._version:
+            self._samples = self._sampleModel()
+            self._version = self._OM.version
+        stats = self._OM.stats
+        return (self._samples, self._OM.machineMode,
+                stats['requests'], stats['timeouts'],
+                stats['latencyLast'], stats['latencyMax'], stats['latencySum'],
+                tuple(sorted(stats['breakers'].items())), stats['breakerSkips'])
+
+    def _sampleModel(self):
+        samples = []
+        for name, family in self._families.items():
+            values = []
+            for path in family:
+                for labels, value in path.walk(self._OM.model):
+                    if isinstance(value, bool):
+                        values.append((labels, int(value)))
+                    elif isinstance(value, (int, float)):
+                        values.append((labels, value))
+            samples.append((name, tuple(values)))
+        return tuple(samples)
+
+    def refresh(self):
+        '''
+            Samples the selected paths and re-renders the metrics text,
+            but only when a value or counter has changed since the last render.
+        '''
+        sample = self._sample()
+        if sample == self._last:
+            return False
+        self._last = sample
+        (samples, mode, requests, timeouts, latency, latencyMax, latencySum,
+         breakers, breakerSkips) = sample
+        gauges = []
+        for name, values in samples:
+            gauges.append('# TYPE ' + name + ' gauge\n')
+            for labels, value in values:
+                if labels:
+                    gauges.append(name + '{' + ','.join(l + '="' + str(i) + '"' for l, i in labels)
+                                  + '} ' + repr(value) + '\n')
+                else:
+                    gauges.append(name + ' ' + repr(value) + '\n')
+        gauges.append('# TYPE serialom_connected gauge\n')
+        gauges.append('serialom_connected ' + ('1' if mode else '0') + '\n')
+        gauges.append('# TYPE serialom_request_latency_last_milliseconds gauge\n')
+        gauges.append('serialom_request_latency_last_milliseconds ' + str(latency) + '\n')
+        gauges.append('# TYPE serialom_request_latency_max_milliseconds gauge\n')
+        gauges.append('serialom_request_latency_max_milliseconds ' + str(latencyMax) + '\n')
+        gauges.append('# TYPE serialom_key_failures gauge\n')
+        for key, failures in breakers:
+            gauges.append('serialom_key_failures{key="' + key + '"} ' + str(failures) + '\n')
+        gauges = ''.join(gauges)
+        # Counter 'family' names differ between the two formats
+        counters = (('serialom_requests', requests),
+                    ('serialom_request_timeouts', timeouts),
+                    ('serialom_breaker_skips', breakerSkips))
+        text = ''.join('# TYPE ' + name + '_total counter\n' + name + '_total ' + str(value) + '\n'
+                       for name, value in counters)
+        openMetrics = ''.join('# TYPE ' + name + ' counter\n' + name + '_total ' + str(value) + '\n'
+                              for name, value in counters)
+        summary = ('# TYPE serialom_request_latency_milliseconds summary\n'
+                   + 'serialom_request_latency_milliseconds_sum ' + str(latencySum) + '\n'
+                   + 'serialom_request_latency_milliseconds_count ' + str(requests - timeouts) + '\n')
+        text += summary
+        openMetrics += summary
+        # Swap in the new renders, scrapes pick up whichever is current
+        self._text = (gauges + text).encode('utf-8')
+        self._openMetrics = (gauges + openMetrics + '# EOF\n').encode('utf-8')
+        self.renders += 1
+        return True
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,202 @@
+from array import array
+from serialOM import omPath, ticks_ms, ticks_diff
+
+'''
+    Value history for serialOM, kept in fixed size ring buffers.
+
+    omHistory records selected numeric model values after each update, each
+    series is an omRing; a preallocated array of values ('f' floats or 'l'
+    integers), an array of timestamps and an array of valid flags. Memory use
+    is fixed when the ring is created, so it is safe for long runs on
+    MicroPython.
+
+    The mean, minimum and maximum of the values in the ring are available in
+    O(1); a running sum is kept, and the minimum/maximum are tracked with
+    monotonic queues (also fixed size arrays).
+
+    Runs on CPython and MicroPython.
+'''
+
+class omRing:
+    '''
+        init arguments:
+            size:       int; number of samples kept
+            typecode:   str; array type for the values, 'f' (float) or 'l' (int), default: 'f'
+            epoch:      int; ticks_ms() that timestamps are relative to, default: now
+            offset:     int; ms to add to timestamps, default: 0. Used when the ring
+                        shares the time base of an earlier epoch
+
+        methods:
+            append(value,time):     Adds a sample, 'time' is a ticks_ms() value. Values
+                                    that are None or not numeric are stored as invalid
+            last():                 The latest valid value, or None
+            mean(), min(), max():   Of the valid values in the ring, or None if there are none
+            samples():              Generator returning (time,value) for the valid samples,
+                                    oldest first. Times are in ms since the epoch (plus
+                                    the offset)
+
+        properties:
+            size:       The ring size
+            count:      Number of valid samples in the ring
+            appended:   Total number of samples appended
+
+        ticks_diff() is only valid for times within about 6 days of each other
+        (on MicroPython), so the time is kept by adding up the ticks between
+        samples, and the stored timestamps are re-based to the oldest sample
+        once per lap. Samples must be appended at least every 6 days.
+    '''
+    def __init__(self, size, typecode='f', epoch=None, offset=0):
+        self.size = size
+        self._typecode = typecode
+        self._ticks = ticks_ms() if epoch is None else epoch
+        self._clock = offset   # ms since the epoch, of the latest sample
+        self._base = offset    # ms since the epoch that stored timestamps are relative to
+        self._values = array(typecode, (0 for i in range(size)))
+        self._times = array('l', (0 for i in range(size)))
+        self._valid = bytearray(size)
+        self._sum = 0
+        self.count = 0
+        self.appended = 0
+        # monotonic queues of sample numbers, for the min and max
+        self._maxQ = [array('l', (0 for i in range(size))), 0, 0]   # [queue, head, length]
+        self._minQ = [array('l', (0 for i in range(size))), 0, 0]
+
+    def _expire(self, queue, oldest):
+        # drop sample numbers that have left the ring from the front of a queue
+        q = queue[0]
+        while queue[2] and q[queue[1]] < oldest:
+            queue[1] = (queue[1] + 1) % self.size
+            queue[2] -= 1
+
+    def _push(self, queue, seq, value, greater):
+        # drop the samples that can no longer be the min/max, then add this one
+        q = queue[0]
+        values = self._values
+        size = self.size
+        while queue[2]:
+            tail = q[(queue[1] + queue[2] - 1) % size]
+            if (values[tail % size] <= value) if greater else (values[tail % size] >= value):
+                queue[2] -= 1
+            else:
+                break
+        q[(queue[1] + queue[2]) % size] = seq
+        queue[2] += 1
+
+    def append(self, value, time):
+        size = self.size
+        seq = self.appended
+        slot = seq % size
+        # the oldest sample is overwritten
+        if self._valid[slot]:
+            self._sum -= self._values[slot]
+            self.count -= 1
+        self._expire(self._maxQ, seq - size + 1)
+        self._expire(self._minQ, seq - size + 1)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            self._values[slot] = int(value) if self._typecode == 'l' else value
+            value = self._values[slot]   # as stored
+            self._valid[slot] = 1
+            self._sum += value
+            self.count += 1
+            self._push(self._maxQ, seq, value, True)
+            self._push(self._minQ, seq, value, False)
+        else:
+            self._values[slot] = 0
+            self._valid[slot] = 0
+        self._clock += ticks_diff(time, self._ticks)
+        self._ticks = time
+        self._times[slot] = self._clock - self._base
+        self.appended += 1
+        if self.appended % size == 0:
+            # re-base the timestamps to the oldest sample once per lap, so they
+            # stay small enough for the array
+            rebase = self._times[0]
+            if rebase:
+                for i in range(size):
+                    self._times[i] -= rebase
+                self._base += rebase
+            if self._typecode != 'l':
+                # recalculate the float sum, so rounding errors do not build up
+                self._sum = sum(self._values[i] for i in range(size) if self._valid[i])
+
+    def last(self):
+        for n in range(min(self.appended, self.size)):
+            slot = (self.appended - 1 - n) % self.size
+            if self._valid[slot]:
+                return self._values[slot]
+        return None
+
+    def mean(self):
+        return self._sum / self.count if self.count else None
+
+    def max(self):
+        q = self._maxQ
+        return self._values[q[0][q[1]] % self.size] if q[2] else None
+
+    def min(self):
+        q = self._minQ
+        return self._values[q[0][q[1]] % self.size] if q[2] else None
+
+    def samples(self):
+        first = max(0, self.appended - self.size)
+        for seq in range(first, self.appended):
+            slot = seq % self.size
+            if self._valid[slot]:
+                yield self._base + self._times[slot], self._values[slot]
+
+
+class omHistory:
+    '''
+        init arguments:
+            OM:         serialOM object
+            paths:      list or dict; model paths to record (see omPath), eg:
+                          ['heat.heaters[*].current','boards[0].vIn.current']
+                        or a dict of {path:typecode} to choose the array type,
+                          eg: {'job.filePosition':'l'}; the default is 'f'
+            size:       int; samples kept for each value, default: 120
+
+            Paths with [*] record every matching entry as a seperate series, named
+            with the actual index; eg: 'heat.heaters[1].current'. Series for new
+            entries are created when they first appear.
+
+        methods:
+            record():           Appends the current values, call after each OM.update()
+            series(name):       Returns the omRing for a series, or None
+
+        properties:
+            rings:              Dictionary of all series: {name:omRing}
+    '''
+    def __init__(self, OM, paths, size=120):
+        self._OM = OM
+        self._size = size
+        # the history keeps its own time since the epoch, as for omRing, so that
+        # series created later share it
+        self._ticks = ticks_ms()
+        self._clock = 0
+        if not isinstance(paths, dict):
+            paths = {path:'f' for path in paths}
+        self._paths = [(omPath(path), typecode) for path, typecode in paths.items()]
+        self.rings = {}
+
+    def record(self):
+        now = ticks_ms()
+        self._clock += ticks_diff(now, self._ticks)
+        self._ticks = now
+        seen = set()
+        for path, typecode in self._paths:
+            if '*' not in path.steps:
+                matches = [(path.path, path.get(self._OM.model))]
+            else:
+                matches = path.expand(self._OM.model)
+            for name, value in matches:
+                if name not in self.rings:
+                    self.rings[name] = omRing(self._size, typecode, now, self._clock)
+                self.rings[name].append(value, now)
+                seen.add(name)
+        # series that have gone from the model get an invalid sample
+        for name, ring in self.rings.items():
+            if name not in seen:
+                ring.append(None, now)
+
+    def series(self, name):
+        return self.rings.get(name)
@@ -0,0 +1,260 @@
+from json import dumps, loads
+from time import time
+
+'''
+    Append-only journal of model changes for serialOM, with time-travel replay.
+
+    After each update the journal appends the changes made to the model, as a
+    list of (path, value) pairs, rather than the whole model. A full snapshot
+    is written every 'snapshotEvery' records, and at the start of each run, so
+    that the model at any past time can be rebuilt from the nearest snapshot
+    before it plus the changes since.
+
+    File format (JSON lines, appended to):
+        {"t":ms,"s":{model}}                    snapshot
+        {"t":ms,"d":[[path,value],[path]..]}    changes; 'path' is a list of keys
+                                                and list indexes, a path without a
+                                                value was removed
+    A second file, 'fileName.idx', lists the time and file offset of each
+    snapshot: 'ms offset' per line. It is rebuilt if missing.
+
+    Timestamps are ms since the epoch, from time().
+
+    Runs on CPython and MicroPython.
+'''
+
+def _copy(value):
+    # A copy of a model value, so later changes to the model do not alter it
+    if isinstance(value, dict):
+        return {k:_copy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    return value
+
+def _diff(old, new, path, changes):
+    # Append the changes that turn 'old' into 'new' to 'changes'
+    if isinstance(new, dict) and isinstance(old, dict):
+        for key, value in new.items():
+            if key in old:
+                _diff(old[key], value, path + [key], changes)
+            else:
+                changes.append([path + [key], value])
+        for key in old:
+            if key not in new:
+                changes.append([path + [key]])
+    elif isinstance(new, list) and isinstance(old, list) and len(new) == len(old):
+        for index in range(len(new)):
+            _diff(old[index], new[index], path + [index], changes)
+    elif old != new or type(old) != type(new):
+        changes.append([path, new])
+
+def _apply(model, change):
+    # Apply a single change to the model
+    path = change[0]
+    node = model
+    for step in path[:-1]:
+        if isinstance(node, dict) and step not in node:
+            node[step] = {}
+        node = node[step]
+    if len(change) > 1:
+        node[path[-1]] = change[1]
+    elif isinstance(node, dict):
+        node.pop(path[-1], None)
+
+
+class omJournal:
+    '''
+        init arguments:
+            OM:             serialOM object
+            fileName:       str; the journal file, appended to
+            snapshotEvery:  int; records between full snapshots, default: 100
+
+        methods:
+            record():       Appends the changes from the last update, call after
+                            each OM.update(). Returns the number of changes written
+            snapshot():     Appends a full snapshot
+            close():        Closes the journal files
+
+        properties:
+            records:        Records written (snapshots and changes)
+            snapshots:      Snapshots written
+
+        Only the keys whose OM.versions differ from the last record are compared
+        for changes, so no changes are lost if record() is not called after an
+        update. Lazy keys (see serialOM) are decoded when they change so they
+        can be compared.
+    '''
+    def __init__(self, OM, fileName, snapshotEvery=100):
+        self._OM = OM
+        self.fileName = fileName
+        self._snapshotEvery = snapshotEvery
+        self._file = None
+        self._index = None
+        self._last = None
+        self._versions = {}   # OM.versions of the keys in _last
+        self._sinceSnapshot = 0
+        self.records = 0
+        self.snapshots = 0
+
+    def _open(self):
+        self._file = open(self.fileName, 'ab')
+        self._index = open(self.fileName + '.idx', 'a')
+
+    def _write(self, entry):
+        self._file.write(dumps(entry, separators=(',', ':')).encode('utf-8') + b'\n')
+        self.records += 1
+
+    def snapshot(self):
+        if self._file is None:
+            self._open()
+        now = int(time() * 1000)
+        self._last = {key:_copy(self._OM.model[key]) for key in list(self._OM.model.keys())}
+        self._versions = dict(self._OM.versions)
+        offset = self._file.tell()
+        self._write({'t':now, 's':self._last})
+        self._file.flush()
+        self._index.write(str(now) + ' ' + str(offset) + '\n')
+        self._index.flush()
+        self._sinceSnapshot = 0
+        self.snapshots += 1
+
+    def record(self):
+        if self._last is None or self._sinceSnapshot >= self._snapshotEvery:
+            self.snapshot()
+            return 0
+        model = self._OM.model
+        changes = []
+        versions = self._OM.versions
+        for key in list(model.keys()):
+            if key not in self._last or versions.get(key) != self._versions.get(key):
+                new = _copy(model[key])
+                _diff(self._last.get(key), new, [key], changes)
+                self._last[key] = new
+                self._versions[key] = versions.get(key)
+        for key in [key for key in self._last if key not in model]:
+            changes.append([[key]])
+            del self._last[key]
+            self._versions.pop(key, None)
+        self._sinceSnapshot += 1
+        if changes:
+            self._write({'t':int(time() * 1000), 'd':changes})
+            self._file.flush()
+        return len(changes)
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._index.close()
+            self._file = None
+            self._index = None
+        self._last = None
+
+
+class omJournalReader:
+    '''
+        init arguments:
+            fileName:       str; a journal written by omJournal
+
+        methods:
+            modelAt(t):     Returns the model as it was at time 't' (ms), or None if
+                            't' is before the first snapshot
+            replay(start,end):
+                            Generator returning (t,model) for each record between
+                            'start' and 'end' (ms, both optional). The same model
+                            dict is updated and returned each time, like OM.model,
+                            so it can be passed straight to an output class:
+                              for t, model in reader.replay():
+                                  out.update(model)
+
+        properties:
+            index:          List of (time,offset) for each snapshot
+            start, end:     Times of the first and last records
+    '''
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.index = self._readIndex()
+        self.start = self.index[0][0] if self.index else None
+        self.end = self._lastTime()
+
+    def _readIndex(self):
+        index = []
+        try:
+            with open(self.fileName + '.idx', 'r') as f:
+                for line in f:
+                    if line.strip():
+                        t, offset = line.split()
+                        index.append((int(t), int(offset)))
+        except OSError:
+            # rebuild it from the journal
+            with open(self.fileName, 'rb') as f:
+                offset = 0
+                for line in f:
+                    if line.startswith(b'{"t":') and b'"s":' in line[:30]:
+                        index.append((loads(line)['t'], offset))
+                    offset += len(line)
+        return index
+
+    def _lastTime(self):
+        if not self.index:
+            return None
+        t = None
+        with open(self.fileName, 'rb') as f:
+            f.seek(self.index[-1][1])
+            for line in f:
+                if line.strip():
+                    t = loads(line)['t']
+        return t
+
+    def _snapshotBefore(self, t):
+        # offset of the last snapshot at or before 't', by bisection
+        low, high = 0, len(self.index)
+        while low < high:
+            middle = (low + high) // 2
+            if self.index[middle][0] <= t:
+                low = middle + 1
+            else:
+                high = middle
+        return self.index[low - 1][1] if low else None
+
+    def _entries(self, offset):
+        with open(self.fileName, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if line.strip():
+                    yield loads(line)
+
+    def modelAt(self, t):
+        offset = self._snapshotBefore(t)
+        if offset is None:
+            return None
+        model = None
+        for entry in self._entries(offset):
+            if entry['t'] > t:
+                break
+            if 's' in entry:
+                model = entry['s']
+            else:
+                for change in entry['d']:
+                    _apply(model, change)
+        return model
+
+    def replay(self, start=None, end=None):
+        if not self.index:
+            return
+        if start is None or start < self.start:
+            start = self.start
+        offset = self._snapshotBefore(start)
+        model = {}
+        for entry in self._entries(offset):
+            if end is not None and entry['t'] > end:
+                break
+            if 's' in entry:
+                # snapshots are applied in place, the caller keeps the same model object
+                for key in [key for key in model if key not in entry['s']]:
+                    del model[key]
+                model.update(entry['s'])
+            else:
+                for change in entry['d']:
+                    _apply(model, change)
+            if entry['t'] >= start:
+                yield entry['t'], model
@@ -0,0 +1,239 @@
+'''
+    A small query language for the serialOM ObjectModel.
+
+    Queries are compiled once and can then be evaluated against the model as
+    often as needed. omQueries keeps a set of named queries up to date, only
+    re-evaluating those whose top level key has changed (see OM.versions).
+
+    Query syntax:
+        A model path, keys seperated by '.', with list steps in brackets:
+          [n]             list entry 'n'
+          [*] or []       all list entries
+          [field=value]   the list entries where 'field' equals 'value', other
+                          comparisons are !=, <, <=, > and >=. 'field' can be a
+                          path below the entry, eg: [microstepping.value=16]
+          [field]         the list entries where 'field' is true
+        Several filters can follow each other, an entry must match them all.
+        Values can be numbers, true, false, null or text (quotes are optional).
+
+        The whole path can be wrapped in an aggregate:
+          max(..) min(..) sum(..) avg(..) count(..)
+
+    Examples:
+        'heat.heaters[state=fault]'                      heaters in fault
+        'count(heat.heaters[state=fault])'               how many
+        'max(tools[*].active[*])'                        highest tool active temperature
+        'move.axes[visible][homed].machinePosition'      positions of visible, homed axes
+        'boards[0].vIn.current'                          a single value
+
+    Paths without [*], [] or filters return a single value (None if it is not in
+    the model), other paths return a list of the matching values.
+
+    Runs on CPython and MicroPython.
+'''
+
+_aggregates = ('max', 'min', 'sum', 'avg', 'count')
+_operators = ('!=', '>=', '<=', '=', '>', '<')   # longest first
+
+
+class omQueryError(Exception):
+    '''
+        Raised when a query cannot be compiled.
+    '''
+    pass
+
+
+def _value(text):
+    # Convert a filter value to the matching python type
+    text = text.strip()
+    if text[:1] in ('"', "'") and text[-1:] == text[:1]:
+        return text[1:-1]
+    if text in ('true', 'false'):
+        return text == 'true'
+    if text == 'null':
+        return None
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+def _number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class omQuery:
+    '''
+        init arguments:
+            expression: str; the query, see above
+
+        methods:
+            evaluate(model):    Returns the result of the query for the model
+
+        properties:
+            expression:     The query text
+            key:            The top level model key the query reads
+            aggregate:      The aggregate function name, or None
+    '''
+
+    def __init__(self, expression):
+        self.expression = expression
+        self.aggregate = None
+        path = expression.strip()
+        if path[-1:] == ')' and '(' in path:
+            self.aggregate = path[:path.index('(')].strip()
+            if self.aggregate not in _aggregates:
+                raise omQueryError('unknown aggregate "' + self.aggregate + '" in: ' + expression)
+            path = path[path.index('(') + 1:-1].strip()
+        self._steps = self._compile(path)
+        if not self._steps or self._steps[0][0] != 'k':
+            raise omQueryError('query must start with a model key: ' + expression)
+        self.key = self._steps[0][1]
+        self._many = any(step[0] in ('*', '?') for step in self._steps)
+
+    def _compile(self, path):
+        # Steps are tuples: ('k',key) ('i',index) ('*',) ('?',field,operator,value)
+        steps = []
+        name = ''
+        i = 0
+        while i < len(path):
+            c = path[i]
+            if c in '.[' and name:
+                steps.append(('k', name.strip()))
+                name = ''
+            if c == '[':
+                end = path.find(']', i)
+                if end < 0:
+                    raise omQueryError('missing "]" in: ' + self.expression)
+                inner = path[i + 1:end].strip()
+                if inner in ('', '*'):
+                    steps.append(('*',))
+                elif inner.lstrip('-').isdigit():
+                    steps.append(('i', int(inner)))
+                else:
+                    # a filter selects from all entries, unless it follows another filter
+                    if not steps or steps[-1][0] != '?':
+                        steps.append(('*',))
+                    steps.append(self._condition(inner))
+                i = end + 1
+                continue
+            if c != '.':
+                name += c
+            i += 1
+        if name:
+            steps.append(('k', name.strip()))
+        return steps
+
+    def _condition(self, text):
+        for operator in _operators:
+            if operator in text:
+                field, value = text.split(operator, 1)
+                return ('?', field.strip().split('.'), operator, _value(value))
+        return ('?', text.strip().split('.'), None, None)
+
+    def _test(self, node, field, operator, value):
+        # True if the entry passes a filter
+        try:
+            for name in field:
+                node = node[name]
+        except (KeyError, IndexError, TypeError):
+            return False
+        if operator is None:
+            return bool(node)
+        if operator == '=':
+            return node == value
+        if operator == '!=':
+            return node != value
+        try:
+            if operator == '>':
+                return node > value
+            if operator == '>=':
+                return node >= value
+            if operator == '<':
+                return node < value
+            return node <= value
+        except TypeError:
+            return False
+
+    def evaluate(self, model):
+        nodes = [model]
+        for step in self._steps:
+            kind = step[0]
+            found = []
+            for node in nodes:
+                try:
+                    if kind == 'k' or kind == 'i':
+                        found.append(node[step[1]])
+                    elif kind == '*':
+                        if isinstance(node, list):
+                            found.extend(node)
+                    elif self._test(node, step[1], step[2], step[3]):
+                        found.append(node)
+                except (KeyError, IndexError, TypeError):
+                    pass
+            nodes = found
+        if self.aggregate == 'count':
+            return len(nodes)
+        if self.aggregate:
+            numbers = [value for value in nodes if _number(value)]
+            if self.aggregate == 'sum':
+                return sum(numbers)
+            if not numbers:
+                return None
+            if self.aggregate == 'max':
+                return max(numbers)
+            if self.aggregate == 'min':
+                return min(numbers)
+            return sum(numbers) / len(numbers)
+        if self._many:
+            return nodes
+        return nodes[0] if nodes else None
+
+
+class omQueries:
+    '''
+        Keeps the results of a set of named queries up to date.
+
+        init arguments:
+            OM:         serialOM object
+            queries:    dict; {name:expression}, optional
+
+        methods:
+            add(name,expression):   Compiles and adds a query
+            refresh():              Re-evaluates the queries whose key has changed since
+                                    they were last evaluated, call after OM.update().
+                                    Returns a list of the names of the re-evaluated queries
+
+        properties:
+            results:        Dictionary of the current results: {name:result}
+            evaluations:    Number of query evaluations made
+    '''
+
+    def __init__(self, OM, queries=None):
+        self._OM = OM
+        self._queries = {}
+        self._versions = {}
+        self.results = {}
+        self.evaluations = 0
+        for name, expression in (queries or {}).items():
+            self.add(name, expression)
+
+    def add(self, name, expression):
+        self._queries[name] = omQuery(expression)
+        self._versions.pop(name, None)
+        self.results[name] = None
+
+    def refresh(self):
+        evaluated = []
+        for name, query in self._queries.items():
+            version = self._OM.versions.get(query.key)
+            if name in self._versions and self._versions[name] == version:
+                continue
+            self.results[name] = query.evaluate(self._OM.model)
+            self._versions[name] = version
+            self.evaluations += 1
+            evaluated.append(name)
+        return evaluated
@@ -0,0 +1,252 @@
+from array import array
+from struct import pack, unpack, calcsize
+from json import dumps, loads
+from time import time, localtime
+from sys import byteorder
+from serialOM import omPath
+
+'''
+    Columnar telemetry recorder for serialOM.
+
+    Appends selected numeric model values to a compact binary file that can
+    be memory-mapped and scanned with NumPy, without parsing any text.
+
+    File layout:
+        header:     8 byte magic, uint32 length of the JSON description, the JSON
+                    (columns, block size, byte order, creation time), padded to 8 bytes.
+        blocks:     fixed size, each has a 24 byte index header; the number of rows
+                    used (uint32), padding (uint32), and the first and last
+                    timestamps (int64, ms), followed by each column as a fixed
+                    width array of 'blockRows' values.
+
+    Column types are array typecodes; 'f' (float32), 'd' (float64),
+    'i' (int32) and 'q' (int64). The first column is always 'time', ms since
+    the epoch (int64). Missing values are NaN in float columns and the
+    smallest possible value in integer columns.
+
+    The partially filled block is rewritten in place every 'flushRows' rows,
+    so the file is always readable while it is being recorded.
+
+    The recorder runs on CPython (and should run on MicroPython with 'q'
+    array support). readRecording() and readRecordings() need NumPy.
+'''
+
+MAGIC = b'OMREC\x00\x01\x00'
+_blockIndex = '=IIqq'   # rows, padding, tMin, tMax
+_itemSizes = {'f':4, 'd':8, 'i':4, 'q':8}
+_missing = {'f':float('nan'), 'd':float('nan'), 'i':-2**31, 'q':-2**63}
+_numpyTypes = {'f':'f4', 'd':'f8', 'i':'i4', 'q':'i8'}
+
+
+class omRecorder:
+    '''
+        init arguments:
+            OM:         serialOM object
+            paths:      list or dict; model paths to record (see omPath), eg:
+                          ['heat.heaters[*].current','boards[0].vIn.current']
+                        or a dict of {path:typecode}, eg: {'job.filePosition':'q'},
+                        the default type is 'f'
+            prefix:     str; file names are 'prefix-YYYYMMDD-HHMMSS.omr',
+                        default: 'telemetry'
+            rotate:     str; start a new file for each 'job' (when job.file.fileName
+                        changes) or 'day', default: None (one file)
+            blockRows:  int; rows per block, default: 256
+            flushRows:  int; rows between writes of the current block, default: 16
+
+            Paths with [*] become one column per entry, named with the actual index,
+            eg: 'heat.heaters[1].current'. The columns are fixed when a file is
+            started; entries that appear later are recorded from the next file.
+
+        methods:
+            record():       Appends the current values, call after each OM.update()
+            close():        Writes any buffered rows and closes the file
+
+        properties:
+            fileName:       The current file, or None
+            columns:        List of (name,typecode) for the current file
+            rows:           Rows written to the current file
+    '''
+    def __init__(self, OM, paths, prefix='telemetry', rotate=None,
+                 blockRows=256, flushRows=16):
+        if rotate not in (None, 'job', 'day'):
+            raise ValueError('rotate must be None, "job" or "day"')
+        self._OM = OM
+        if not isinstance(paths, dict):
+            paths = {path:'f' for path in paths}
+        for typecode in paths.values():
+            if typecode not in _itemSizes:
+                raise ValueError('unsupported column type "' + typecode + '"')
+        self._paths = [(omPath(path), typecode) for path, typecode in paths.items()]
+        self._prefix = prefix
+        self._rotate = rotate
+        self._rotateKey = None
+        self._jobPath = omPath('job.file.fileName')
+        self._blockRows = blockRows
+        self._flushRows = flushRows
+        self._file = None
+        self.fileName = None
+        self.columns = []
+        self.rows = 0
+
+    def _rotation(self):
+        # the value that starts a new file when it changes
+        if self._rotate == 'job':
+            return self._jobPath.get(self._OM.model) or ''
+        if self._rotate == 'day':
+            return localtime()[:3]
+        return None
+
+    def _open(self):
+        # start a new file, the columns are taken from the current model
+        self.close()
+        self.columns = [('time', 'q')]
+        self._getters = []
+        for path, typecode in self._paths:
+            if '*' in path.steps:
+                for name, value in path.expand(self._OM.model):
+                    self.columns.append((name, typecode))
+                    self._getters.append(omPath(name))
+            else:
+                self.columns.append((path.path, typecode))
+                self._getters.append(path)
+        t = localtime()
+        stamp = '%04d%02d%02d-%02d%02d%02d' % t[:6]
+        self.fileName = self._prefix + '-' + stamp + '.omr'
+        header = dumps({'columns':self.columns, 'blockRows':self._blockRows,
+                        'byteorder':byteorder, 'created':int(time() * 1000),
+                        'job':self._jobPath.get(self._OM.model)}).encode('utf-8')
+        header = MAGIC + pack('<I', len(header)) + header
+        header += b' ' * (-len(header) % 8)
+        self._headerSize = len(header)
+        self._blockSize = calcsize(_blockIndex) + sum(_itemSizes[t] * self._blockRows
+                                                       for name, t in self.columns)
+        self._file = open(self.fileName, 'wb')
+        self._file.write(header)
+        self._block = 0
+        self._newBlock()
+        self.rows = 0
+
+    def _newBlock(self):
+        self._data = [array(t, (_missing[t] for i in range(self._blockRows)))
+                      for name, t in self.columns]
+        self._row = 0
+        self._tMin = 0
+        self._tMax = 0
+
+    def _writeBlock(self):
+        # (re)write the current block at it's position in the file
+        self._file.seek(self._headerSize + self._block * self._blockSize)
+        self._file.write(pack(_blockIndex, self._row, 0, self._tMin, self._tMax))
+        for column in self._data:
+            self._file.write(column)
+        self._file.flush()
+
+    def record(self):
+        key = self._rotation()
+        if self._file is None or key != self._rotateKey:
+            self._rotateKey = key
+            self._open()
+        now = int(time() * 1000)
+        row = self._row
+        self._data[0][row] = now
+        for column, getter in enumerate(self._getters):
+            value = getter.get(self._OM.model)
+            if isinstance(value, (int, float)):
+                if self.columns[column + 1][1] in ('i', 'q'):
+                    value = int(value)
+                self._data[column + 1][row] = value
+        if row == 0:
+            self._tMin = now
+        self._tMax = now
+        self._row += 1
+        self.rows += 1
+        if self._row == self._blockRows:
+            self._writeBlock()
+            self._block += 1
+            self._newBlock()
+        elif self._row % self._flushRows == 0:
+            self._writeBlock()
+
+    def close(self):
+        if self._file:
+            if self._row:
+                self._writeBlock()
+            self._file.close()
+            self._file = None
+
+
+def readHeader(fileName):
+    '''
+        Returns the JSON description from a recording, plus 'headerSize'
+    '''
+    with open(fileName, 'rb') as f:
+        if f.read(8) != MAGIC:
+            raise ValueError(fileName + ' is not a serialOM recording')
+        length = unpack('<I', f.read(4))[0]
+        header = loads(f.read(length).decode('utf-8'))
+    header['headerSize'] = (12 + length + 7) // 8 * 8
+    return header
+
+def _blocks(fileName):
+    # memory map the blocks of a recording as a NumPy structured array
+    import numpy as np
+    header = readHeader(fileName)
+    order = '<' if header['byteorder'] == 'little' else '>'
+    rows = header['blockRows']
+    dtype = np.dtype([('rows', order + 'u4'), ('pad', order + 'u4'),
+                      ('tMin', order + 'i8'), ('tMax', order + 'i8')]
+                     + [(name, order + _numpyTypes[t], (rows,)) for name, t in header['columns']])
+    with open(fileName, 'rb') as f:
+        f.seek(0, 2)
+        count = (f.tell() - header['headerSize']) // dtype.itemsize
+    if count <= 0:
+        return header, None
+    return header, np.memmap(fileName, dtype=dtype, mode='r',
+                             offset=header['headerSize'], shape=(count,))
+
+def readRecording(fileName, columns=None, start=None, end=None):
+    '''
+        Reads a recording with NumPy; returns a dict of 1D arrays, {column:values}
+        'columns' is an optional list of the columns to read, 'time' is always read.
+        'start' and 'end' optionally limit the time range (ms since the epoch),
+        blocks outside of it are skipped using the block index.
+    '''
+    import numpy as np
+    header, blocks = _blocks(fileName)
+    names = [name for name, t in header['columns']]
+    if columns is not None:
+        names = ['time'] + [name for name in columns if name in names and name != 'time']
+    if blocks is None:
+        return {name:np.array([]) for name in names}
+    select = blocks['rows'] > 0
+    if start is not None:
+        select &= blocks['tMax'] >= start
+    if end is not None:
+        select &= blocks['tMin'] <= end
+    used = np.arange(header['blockRows']) < blocks['rows'][select][:, None]
+    data = {name:blocks[name][select][used] for name in names}
+    if start is not None or end is not None:
+        keep = np.ones(len(data['time']), dtype=bool)
+        if start is not None:
+            keep &= data['time'] >= start
+        if end is not None:
+            keep &= data['time'] <= end
+        data = {name:values[keep] for name, values in data.items()}
+    return data
+
+def readRecordings(fileNames, columns=None, start=None, end=None):
+    '''
+        Reads and joins several recordings (eg: a month of daily files) in order,
+        columns that are not in a file are filled with NaN for its rows.
+    '''
+    import numpy as np
+    parts = [readRecording(name, columns, start, end) for name in sorted(fileNames)]
+    names = []
+    for part in parts:
+        names += [name for name in part if name not in names]
+    data = {}
+    for name in names:
+        data[name] = np.concatenate([part[name] if name in part
+                                     else np.full(len(part['time']), np.nan)
+                                     for part in parts]) if parts else np.array([])
+    return data
@@ -0,0 +1,194 @@
+from json import dumps
+
+'''
+    Model access tracker for serialOM, a diagnostic tool.
+
+    Wraps the model passed to an output class in proxies that record every
+    path that is read, per machine mode. Over a run this shows exactly which
+    keys and fields the output uses, and can be turned into a minimal omKeys
+    and field configuration for serialOM.
+
+    Paths are written as: 'heat.heaters[].current'; '[]' is any list entry.
+    Containers that are used as a whole (len(), truth tests, etc) are recorded
+    too, eg: 'network.interfaces'.
+
+    Runs on CPython and MicroPython, but is not intended for normal use;
+    every model read goes through the proxies.
+'''
+
+def _wrap(value, path, record):
+    # Wrap containers so that reads below them are tracked, values are returned as-is
+    if isinstance(value, dict):
+        return _dictProxy(value, path, record)
+    if isinstance(value, list):
+        return _listProxy(value, path, record)
+    return value
+
+def _unwrap(value):
+    if isinstance(value, (_dictProxy, _listProxy)):
+        return value._data
+    return value
+
+
+class _dictProxy:
+    # Read-only view of a dict that records the keys read
+    def __init__(self, data, path, record):
+        self._data = data
+        self._path = path
+        self._record = record
+
+    def _child(self, key):
+        return self._path + '.' + key if self._path else key
+
+    def __getitem__(self, key):
+        path = self._child(key)
+        self._record(path)
+        return _wrap(self._data[key], path, self._record)
+
+    def get(self, key, default=None):
+        if key not in self._data:
+            return default
+        return self[key]
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def keys(self):
+        return self._data.keys()
+
+    def values(self):
+        return [self[key] for key in self._data]
+
+    def items(self):
+        return [(key, self[key]) for key in self._data]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        if self._path:
+            self._record(self._path)
+        return len(self._data)
+
+    def __bool__(self):
+        return self.__len__() > 0
+
+    def __eq__(self, other):
+        return self._data == _unwrap(other)
+
+    def __repr__(self):
+        return repr(self._data)
+
+
+class _listProxy:
+    # Read-only view of a list that records the entries read, all indexes are 'path[]'
+    def __init__(self, data, path, record):
+        self._data = data
+        self._path = path
+        self._record = record
+
+    def __getitem__(self, index):
+        self._record(self._path + '[]')
+        if isinstance(index, slice):
+            return [_wrap(v, self._path + '[]', self._record) for v in self._data[index]]
+        return _wrap(self._data[index], self._path + '[]', self._record)
+
+    def __iter__(self):
+        self._record(self._path + '[]')
+        for value in self._data:
+            yield _wrap(value, self._path + '[]', self._record)
+
+    def __contains__(self, value):
+        self._record(self._path + '[]')
+        return _unwrap(value) in self._data
+
+    def index(self, value):
+        self._record(self._path + '[]')
+        return self._data.index(_unwrap(value))
+
+    def __len__(self):
+        self._record(self._path)
+        return len(self._data)
+
+    def __bool__(self):
+        return self.__len__() > 0
+
+    def __eq__(self, other):
+        return self._data == _unwrap(other)
+
+    def __repr__(self):
+        return repr(self._data)
+
+
+class omTracker:
+    '''
+        init arguments:
+            none
+
+        methods:
+            wrap(model,mode):   Returns a tracking proxy for the model, pass this to the
+                                output class instead of the model. 'mode' is the machine
+                                mode the reads are recorded for.
+            report():           Returns the minimal configuration for the recorded reads:
+                                  {'omKeys':{mode:[keys]},
+                                   'fields':{mode:{key:[paths]}},
+                                   'depth':{mode:{key:levels}}}
+                                'omKeys' are the top level keys read, except 'state' which
+                                serialOM always fetches. 'fields' lists the paths read
+                                below each key, relative to the key and without paths
+                                that are covered by a longer one. 'depth' is the deepest
+                                nesting level read in each key.
+            save(fileName):     Writes the report as JSON, if anything new was read
+                                since the last save. Returns True if written.
+
+        properties:
+            paths:              Dictionary of the paths read in each mode: {mode:set()}
+    '''
+
+    def __init__(self):
+        self.paths = {}
+        self._changed = False
+
+    def wrap(self, model, mode):
+        paths = self.paths.setdefault(mode, set())
+
+        def record(path):
+            if path not in paths:
+                paths.add(path)
+                self._changed = True
+
+        return _dictProxy(model, '', record)
+
+    def _levels(self, path):
+        # nesting depth of a relative path: 'heaters[].current' --> 3, '[].vIn.current' --> 3
+        # a leading '[]' (a list valued key) has no name before it
+        names = path.count('.') + (0 if path.startswith('[') else 1)
+        return names + path.count('[]')
+
+    def report(self):
+        report = {'omKeys':{}, 'fields':{}, 'depth':{}}
+        for mode, paths in self.paths.items():
+            fields = {}
+            for path in sorted(paths):
+                # only keep the leaves, a longer path covers it's parents
+                if any(other != path and (other.startswith(path + '.')
+                       or other.startswith(path + '[]')) for other in paths):
+                    continue
+                key = path.split('.')[0].split('[')[0]
+                rest = path[len(key):].lstrip('.')
+                fields.setdefault(key, [])
+                if rest:
+                    fields[key].append(rest)
+            report['omKeys'][mode] = [key for key in sorted(fields) if key != 'state']
+            report['fields'][mode] = fields
+            report['depth'][mode] = {key:max([self._levels(p) for p in fields[key]] or [0])
+                                     for key in fields}
+        return report
+
+    def save(self, fileName):
+        if not self._changed:
+            return False
+        with open(fileName, 'w') as f:
+            f.write(dumps(self.report(), indent=2))
+        self._changed = False
+        return True
@@ -292,14 +292,15 @@ class outputRRF:
         # a local function to return state and temperature details for a heater
         def showHeater(number,name):
             r = ''
-            if self._OM['heat']['heaters'][number]['state'] == 'fault':
+            heater = self._OM['heat']['heaters'][number]
+            if heater['state'] == 'fault':
                 r += ' | ' + name + ': FAULT'
             else:
-                r += ' | ' + name + ': ' + '%.1f' % self._OM['heat']['heaters'][number]['current']
-                if self._OM['heat']['heaters'][number]['state'] == 'active':
-                    r += ' (%.1f)' % self._OM['heat']['heaters'][number]['active']
-                elif self._OM['heat']['heaters'][number]['state'] == 'standby':
-                    r += ' (%.1f)' % self._OM['heat']['heaters'][number]['standby']
+                r += ' | ' + name + ': ' + '%.1f' % heater['current']
+                if heater['state'] == 'active':
+                    r += ' (%.1f)' % heater['active']
+                elif heater['state'] == 'standby':
+                    r += ' (%.1f)' % heater['standby']
             return r
 
         r = ''
@@ -314,9 +315,9 @@ class outputRRF:
                 r += showHeater(self._OM['heat']['chamberHeaters'][0],'chamber')
         # Extruders
         if len(self._OM['tools']) > 0:
-            for tool in self._OM['tools']:
+            for number, tool in enumerate(self._OM['tools']):
                 if len(tool['heaters']) > 0:
-                    r += showHeater(tool['heaters'][0],'e' + str(self._OM['tools'].index(tool)))
+                    r += showHeater(tool['heaters'][0],'e' + str(number))
         #display
         bed = self._OM['heat']['heaters'][0]['current']
         units=int(bed)
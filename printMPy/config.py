@@ -18,9 +18,12 @@ class config():
         Timing and timeout config:
         updateTime:     (int, ms)  Basic time interval between update cycles
         rebootDelay:    (int) Countdown in seconds when auto-restarting/rebooting printPy
+        updateBudget:   (int, ms)  Time limit for fetching data in each update cycle,
+                        keys that do not fit are deferred to the next cycle, None to disable
     '''
     updateTime = 1000
     rebootDelay = 3
+    updateBudget = None
 
     '''
         Logging Config:
@@ -29,6 +29,7 @@ class outputRRF:
 
         properties:
             omKeys       : see below
+            omProfiles   : see below
             running      : (bool) can be set False if the output device fails
             statusActive : (bool) set True while a status is being displayed
 '''
@@ -40,6 +41,13 @@ class outputRRF:
               'CNC':['spindles','tools','move','job','boards','network'],
               'Laser':['move','job','boards','network']}
 
+    # Optional polling profiles, keyed by the machine status (see serialOM)
+    # The job is not shown while idle, only the common items when off
+    omProfiles = {'off':{'keys':['boards','network'],'interval':10000},
+                  'idle':{'keys':{'FFF':['heat','tools','boards','network'],
+                                  'CNC':['spindles','tools','move','boards','network'],
+                                  'Laser':['move','boards','network']}}}
+
     def __init__(self, log=None):
         self._log = log
         self._OM = None
@@ -155,10 +163,12 @@ class outputRRF:
 
     def _updateJob(self):
         # Job progress
+        # the 'job' key is not fetched by the idle and off profiles
         r = ''
-        if self._OM['job']['build']:
+        job = self._OM.get('job')
+        if job and job['build']:
             try:
-                percent = self._OM['job']['filePosition'] / self._OM['job']['file']['size'] * 100
+                percent = job['filePosition'] / job['file']['size'] * 100
             except ZeroDivisionError:  # file size can be 0 as the job starts
                 percent = 0
             r += ' | progress: ' + "%.1f%%" % percent
@@ -211,14 +221,15 @@ class outputRRF:
         # a local function to return state and temperature details for a heater
         def showHeater(number,name):
             r = ''
-            if self._OM['heat']['heaters'][number]['state'] == 'fault':
+            heater = self._OM['heat']['heaters'][number]
+            if heater['state'] == 'fault':
                 r += ' | ' + name + ': FAULT'
             else:
-                r += ' | ' + name + ': ' + '%.1f' % self._OM['heat']['heaters'][number]['current']
-                if self._OM['heat']['heaters'][number]['state'] == 'active':
-                    r += ' (%.1f)' % self._OM['heat']['heaters'][number]['active']
-                elif self._OM['heat']['heaters'][number]['state'] == 'standby':
-                    r += ' (%.1f)' % self._OM['heat']['heaters'][number]['standby']
+                r += ' | ' + name + ': ' + '%.1f' % heater['current']
+                if heater['state'] == 'active':
+                    r += ' (%.1f)' % heater['active']
+                elif heater['state'] == 'standby':
+                    r += ' (%.1f)' % heater['standby']
             return r
 
         r = ''
@@ -233,9 +244,9 @@ class outputRRF:
                 r += showHeater(self._OM['heat']['chamberHeaters'][0],'chamber')
         # Extruders
         if len(self._OM['tools']) > 0:
-            for tool in self._OM['tools']:
+            for number, tool in enumerate(self._OM['tools']):
                 if len(tool['heaters']) > 0:
-                    r += showHeater(tool['heaters'][0],'e' + str(self._OM['tools'].index(tool)))
+                    r += showHeater(tool['heaters'][0],'e' + str(number))
         return r
 
     def _updateCNC(self):
@@ -1,5 +1,5 @@
 # Import our local classes and config
-from serialOM import serialOM
+from serialOM import serialOM,serialOMError
 from outputTXT import outputRRF
 from lumenSTUB import lumen
 from config import config
@@ -132,7 +132,9 @@ led.blink('busy')
 
 # create the OM handler
 try:
-    OM = serialOM(rrf, out.omKeys, rawLog, config.quiet)
+    OM = serialOM(rrf, out.omKeys, rawLog, config.quiet,
+                  profiles=getattr(out, 'omProfiles', None),
+                  fields=getattr(out, 'omFields', None))
 except Exception as e:
     restartNow('Failed to start ObjectModel communications\n' + str(e))
 
@@ -154,7 +156,15 @@ while True:
     led.send()
     haveData = False
     try:
-        haveData = OM.update()
+        haveData = OM.update(config.updateBudget)
+    except serialOMError as e:
+        # try to resume on the same UART before resorting to a reboot
+        pp('Error while fetching machine state\n' + str(e))
+        try:
+            if not OM.reconnect():
+                restartNow('Unable to reconnect to controller')
+        except serialOMError as e:
+            restartNow('Error while reconnecting\n' + str(e))
     except Exception as e:
         restartNow('Error while fetching machine state\n' + str(e))
     # output the results if successful
@@ -170,6 +180,6 @@ while True:
     # check output is running and restart if not
     if not out.running:
         restartNow('Output device has failed')
-    # Request cycle ended, wait for next
-    while ticks_diff(ticks_ms(),begin) < config.updateTime:
+    # Request cycle ended, wait for next, the polling profile may set the interval
+    while ticks_diff(ticks_ms(),begin) < (OM.interval or config.updateTime):
         sleep_ms(1)
@@ -19,9 +19,15 @@ class config():
         Timing and timeout config:
         updateTime:     (int, ms)  Basic time interval between update cycles
         rebootDelay:    (int) Countdown in seconds when auto-restarting/rebooting
+        reconnectTime:  (int, ms)  How long to keep trying to reconnect after a comms
+                        error before falling back to a full restart
+        updateBudget:   (int, ms)  Time limit for fetching data in each update cycle,
+                        keys that do not fit are deferred to the next cycle, None to disable
     '''
     updateTime = 1000
     rebootDelay = 3
+    reconnectTime = 10000
+    updateBudget = None
 
     '''
         Logging Config:
@@ -29,6 +35,31 @@ class config():
         rawLog:     A raw log of all incoming serial data
         outputLog:  Log file passed to the output module
                     - The example TXT output class will mirror it's output there
+        journal:    A journal of model changes, with periodic snapshots, that can be
+                    replayed later (see omJournal)
     '''
     rawLog = None
     outputLog = None
+    journal = None
+
+    '''
+        Metrics exporter config:
+        exporterPort:   (int) Serve OpenMetrics/Prometheus metrics on this local port
+                        at '/metrics', or None to disable.
+        exporterPaths:  (list[strings]) Numeric model values to export,
+                        '[*]' exports every entry in a list.
+    '''
+    exporterPort = None
+    exporterPaths = ['heat.heaters[*].current',
+                     'heat.heaters[*].active',
+                     'job.filePosition',
+                     'boards[0].vIn.current']
+
+    '''
+        Diagnostics config:
+        accessReport:   Replace "None" with "'filename.json'" to record which model
+                        keys and fields the output class reads, the file is updated
+                        with the minimal omKeys, fields and depth for each mode.
+                        - This slows down the output, do not leave it enabled
+    '''
+    accessReport = None
@@ -19,16 +19,19 @@ class outputRRF:
             log : log file object or None to disable.
 
         methods:
-            update(model,hostinfo) : Updates the local model copy and
+            update(model,hostinfo,indexes) : Updates the local model copy and
                 returns a string with the human-readable machine state info.
                 Writes to logfile with timestamp if required.
                 hostinfo is optional, it will be prepended if present.
+                indexes is optional, the serialOM.indexes lookup tables; when
+                given the heaters are found with these instead of the model.
             showStatus(model,hostinfo) : Updates the local model copy and
                 returns a 'status' block.
                 Aimed at display devices to show extra info when triggered.
 
         properties:
             omKeys       : see below
+            omProfiles   : see below
             running      : (bool) can be set False if the output device fails
             statusActive : (bool) set True while a status is being displayed
 '''
@@ -40,17 +43,26 @@ class outputRRF:
               'CNC':['spindles','tools','move','job','boards','network'],
               'Laser':['move','job','boards','network']}
 
+    # Optional polling profiles, keyed by the machine status (see serialOM)
+    # The job is not shown while idle, only the common items when off
+    omProfiles = {'off':{'keys':['boards','network'],'interval':10000},
+                  'idle':{'keys':{'FFF':['heat','tools','boards','network'],
+                                  'CNC':['spindles','tools','move','boards','network'],
+                                  'Laser':['move','boards','network']}}}
+
     def __init__(self, log=None):
         self._log = log
         self._OM = None
+        self._indexes = None
         # If running I2C displays etc this should reflect their status
         self.running = True
         self.statusActive = False
 
-    def update(self,model=None, hostInfo=None):
+    def update(self,model=None, hostInfo=None, indexes=None):
         # Updates the local model, returns the current status text
         if model is not None:
             self._OM = model
+        self._indexes = indexes
         if self._OM is None:
             return('no update data available\n')
         if hostInfo:
@@ -156,10 +168,12 @@ class outputRRF:
 
     def _updateJob(self):
         # Job progress
+        # the 'job' key is not fetched by the idle and off profiles
         r = ''
-        if self._OM['job']['build']:
+        job = self._OM.get('job')
+        if job and job['build']:
             try:
-                percent = self._OM['job']['filePosition'] / self._OM['job']['file']['size'] * 100
+                percent = job['filePosition'] / job['file']['size'] * 100
             except ZeroDivisionError:  # file size can be 0 as the job starts
                 percent = 0
             r += ' | progress: ' + "%.1f%%" % percent
@@ -212,17 +226,28 @@ class outputRRF:
         # a local function to return state and temperature details for a heater
         def showHeater(number,name):
             r = ''
-            if self._OM['heat']['heaters'][number]['state'] == 'fault':
+            heater = self._OM['heat']['heaters'][number]
+            if heater['state'] == 'fault':
                 r += ' | ' + name + ': FAULT'
             else:
-                r += ' | ' + name + ': ' + '%.1f' % self._OM['heat']['heaters'][number]['current']
-                if self._OM['heat']['heaters'][number]['state'] == 'active':
-                    r += ' (%.1f)' % self._OM['heat']['heaters'][number]['active']
-                elif self._OM['heat']['heaters'][number]['state'] == 'standby':
-                    r += ' (%.1f)' % self._OM['heat']['heaters'][number]['standby']
+                r += ' | ' + name + ': ' + '%.1f' % heater['current']
+                if heater['state'] == 'active':
+                    r += ' (%.1f)' % heater['active']
+                elif heater['state'] == 'standby':
+                    r += ' (%.1f)' % heater['standby']
             return r
 
         r = ''
+        if self._indexes is not None:
+            # the heater numbers are maintained by serialOM
+            if self._indexes.get('bedHeater', -1) != -1:
+                r += showHeater(self._indexes['bedHeater'],'bed')
+            if self._indexes.get('chamberHeater', -1) != -1:
+                r += showHeater(self._indexes['chamberHeater'],'chamber')
+            for number, heaters in self._indexes.get('toolHeaters', {}).items():
+                if len(heaters) > 0:
+                    r += showHeater(heaters[0],'e' + str(number))
+            return r
         # For FFF mode we want to show all the Heater states
         # Bed
         if len(self._OM['heat']['bedHeaters']) > 0:
@@ -234,9 +259,9 @@ class outputRRF:
                 r += showHeater(self._OM['heat']['chamberHeaters'][0],'chamber')
         # Extruders
         if len(self._OM['tools']) > 0:
-            for tool in self._OM['tools']:
+            for number, tool in enumerate(self._OM['tools']):
                 if len(tool['heaters']) > 0:
-                    r += showHeater(tool['heaters'][0],'e' + str(self._OM['tools'].index(tool)))
+                    r += showHeater(tool['heaters'][0],'e' + str(number))
         return r
 
     def _updateCNC(self):
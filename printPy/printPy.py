@@ -1,7 +1,7 @@
 from sys import path
 path.insert(0,'..')
 # Import our local classes and config
-from serialOM import serialOM
+from serialOM import serialOM,serialOMError
 from outputTXT import outputRRF
 from config import config
 
@@ -56,6 +56,37 @@ def restartNow(why):
     execv(executable, ['python'] + argv)   #  CPython
     #reset() # Micropython; reboot module
 
+# Re-open the serial device and resume without losing the model
+def reconnect(why):
+    global rrf
+    pp('Error: ' + why)
+    pp('Reconnecting',end='',flush=True)
+    begin = ticks_ms()
+    while ticks_diff(ticks_ms(),begin) < config.reconnectTime:
+        try:
+            rrf.close()
+        except Exception:
+            pass
+        # under linux the device may re-enumerate on a different path
+        for device in config.devices:
+            try:
+                newRrf = Serial(device,config.baud)
+            except Exception:
+                continue
+            try:
+                if OM.reconnect(newRrf):
+                    rrf = newRrf
+                    pp()
+                    print('reconnected to: ' + rrf.name + ' @' + str(rrf.baudrate))
+                    return
+            except serialOMError:
+                pass
+            newRrf.close()
+        pp('.',end='',flush=True)
+        sleep_ms(250)
+    pp()
+    restartNow('Unable to reconnect to controller')
+
 # Used for critical hardware errors during initialisation on MCU's
 # mostly unused in Cpython, instead we soft-fail, restart and try again.
 def hardwareFail(why):
@@ -132,15 +163,48 @@ else:
 
 # create the OM handler
 try:
-    OM = serialOM(rrf, out.omKeys, rawLog, config.quiet)
+    OM = serialOM(rrf, out.omKeys, rawLog, config.quiet,
+                  profiles=getattr(out, 'omProfiles', None),
+                  fields=getattr(out, 'omFields', None))
 except Exception as e:
     restartNow('Failed to start ObjectModel communications\n' + str(e))
 
 if OM.machineMode == '':
     restartNow('Failed to connect to controller, or unsupported controller mode.')
 
+# Optional metrics exporter
+exporter = None
+if config.exporterPort:
+    from omExporter import omExporter
+    try:
+        exporter = omExporter(OM, config.exporterPaths, port=config.exporterPort)
+    except Exception as error:
+        pp('metrics exporter failed to start: ', error)
+    else:
+        pp('metrics exported at: http://127.0.0.1:' + str(config.exporterPort) + '/metrics')
+
+# Optional model change journal
+journal = None
+if config.journal:
+    from omJournal import omJournal
+    journal = omJournal(OM, config.journal)
+    pp('model changes being journaled to: ', config.journal)
+
+# Optional model access tracking
+tracker = None
+if config.accessReport:
+    from omTracker import omTracker
+    tracker = omTracker()
+    pp('model access report being written to: ', config.accessReport)
+
+def outputModel():
+    # The model to pass to the output class, tracked if required
+    if tracker:
+        return tracker.wrap(OM.model, OM.machineMode)
+    return OM.model
+
 # Update the display model and show overall Status
-print(out.showStatus(OM.model),end='')
+print(out.showStatus(outputModel()),end='')
 
 '''
     Main loop
@@ -153,17 +217,29 @@ while True:
     haveData = False
     # request a model update and soft fail on errors
     try:
-        haveData = OM.update()
+        haveData = OM.update(config.updateBudget)
+    except serialOMError as e:
+        reconnect('Error while fetching ObjectModel data\n' + str(e))
     except Exception as e:
         restartNow('Error while fetching ObjectModel data\n' + str(e))
     # output the results if successful
     if haveData:
         # pass the results to the output module and print any response
-        outputText = out.update(OM.model)
+        # the indexes are not used while tracking, so that the access report
+        # includes the fields they are built from
+        outputText = out.update(outputModel(), indexes=None if tracker else OM.indexes)
         if outputText:
              print(outputText,end='')
+        if tracker:
+            tracker.save(config.accessReport)
     else:
         pp('Failed to fetch ObjectModel data')
-    # Request cycle ended, wait for next
-    while ticks_diff(ticks_ms(),begin) < config.updateTime:
+    # journal any changes, a partial update can still change the model
+    if journal:
+        journal.record()
+    # refresh the metrics cache, scrapes are served from this
+    if exporter:
+        exporter.refresh()
+    # Request cycle ended, wait for next, the polling profile may set the interval
+    while ticks_diff(ticks_ms(),begin) < (OM.interval or config.updateTime):
         sleep_ms(1)
@@ -1,6 +1,16 @@
 from sys import implementation
-from json import loads
+from json import loads,load,dumps
 from gc import collect
+try:
+    from sys import getsizeof  # CPython
+except:
+    getsizeof = None
+from os import rename
+try:
+    from binascii import crc32
+except:
+    crc32 = None  # some MicroPython ports
+from time import time
 
 # CPython / MicroPython compatibility:
 # Try to import fast native library, otherwise define a local version
@@ -18,6 +28,18 @@ except:
     def sleep_ms(ms):
         sleep(ms/1000)
 
+# Use a faster JSON decoder if one is installed, the standard library otherwise
+try:
+    from orjson import loads as fastLoads  # CPython, compiled
+    fastDecoder = 'orjson'
+except:
+    try:
+        from ujson import loads as fastLoads
+        fastDecoder = 'ujson'
+    except:
+        fastLoads = loads
+        fastDecoder = 'json'
+
 
 # Standard CPython functions that are not native to Micropython.
 # - provided here for cross-compatibility
@@ -50,6 +72,133 @@ def zip_longest(*args, fillvalue=None):
             values.append(value)
         yield tuple(values)
 
+def merge(a, b):
+    # Recursive/iterative merge of dict/list structures, used to apply
+    # frequent updates to the local model.
+    # https://stackoverflow.com/questions/19378143/python-merging-two-arbitrary-data-structures#1
+    if isinstance(a, dict) and isinstance(b, dict):
+        d = dict(a)
+        d.update({k: merge(a.get(k, None), b[k]) for k in b})
+        return d
+    if isinstance(a, list) and isinstance(b, list):
+        return [merge(x, y) for x, y in zip_longest(a, b)]
+    return a if b is None else b
+
+def internKeys(value, table):
+    # Share the key strings of a decoded payload using 'table'. Values are
+    # replaced in place, each dict is copied with the shared keys only after
+    # it's children are done, so at most one extra dict is alive at a time
+    if isinstance(value, dict):
+        for k, v in value.items():
+            if isinstance(v, (dict, list)):
+                value[k] = internKeys(v, table)
+        return {table.setdefault(k, k):v for k, v in value.items()}
+    if isinstance(value, list):
+        for i in range(len(value)):
+            if isinstance(value[i], (dict, list)):
+                value[i] = internKeys(value[i], table)
+    return value
+
+def internLoads(table):
+    # A json.loads() for CPython that shares key strings using 'table' as each
+    # object is decoded, so no second pass (or copy) is needed
+    def hook(pairs):
+        return {table.setdefault(k, k):v for k, v in pairs}
+    def decode(line):
+        return loads(line, object_pairs_hook=hook)
+    return decode
+
+def compileFields(paths):
+    # Compile a list of field paths, eg: ['heaters[].current','-heaters[].model'],
+    # into a (keep,drop) pair of trees: {'heaters':{'[]':{'current':None}}}, where
+    # None is the end of a path. Paths starting with '-' are dropped, the others kept.
+    keep = {}
+    drop = {}
+    for path in paths:
+        tree = keep
+        if path[:1] == '-':
+            tree = drop
+            path = path[1:]
+        steps = []
+        for part in path.split('.'):
+            name = part.split('[')[0]
+            if name:
+                steps.append(name)
+            steps += ['[]'] * part.count('[]')
+        for step in steps[:-1]:
+            if tree.get(step, {}) is None:
+                break   # a shorter path already covers this one
+            tree = tree.setdefault(step, {})
+        else:
+            tree[steps[-1]] = None
+    return (keep or None, drop or None)
+
+def prune(value, keep, drop=None):
+    # Returns the value with only the 'keep' fields, less the 'drop' fields (see compileFields)
+    if keep is not None:
+        if isinstance(value, dict):
+            value = {k:prune(v, keep[k]) for k, v in value.items() if k in keep}
+        elif isinstance(value, list) and '[]' in keep:
+            value = [prune(v, keep['[]']) for v in value]
+    if drop is not None:
+        if isinstance(value, dict):
+            value = {k:(prune(v, None, drop[k]) if k in drop else v)
+                     for k, v in value.items() if not (k in drop and drop[k] is None)}
+        elif isinstance(value, list) and '[]' in drop:
+            value = [] if drop['[]'] is None else [prune(v, None, drop['[]']) for v in value]
+    return value
+
+def sizeOf(value, seen):
+    # Approximate memory used by a model value, objects in 'seen' are not counted again
+    # Uses getsizeof() on CPython, or an estimate of the MicroPython heap use (32bit)
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, dict):
+        size = getsizeof(value) if getsizeof else 16 + 16 * ((len(value) * 8 + 15) // 16)
+        for k, v in value.items():
+            size += sizeOf(k, seen) + sizeOf(v, seen)
+        return size
+    if isinstance(value, list):
+        size = getsizeof(value) if getsizeof else 16 + 16 * ((len(value) * 4 + 15) // 16)
+        return size + sum(sizeOf(v, seen) for v in value)
+    if getsizeof:
+        return getsizeof(value)
+    if isinstance(value, str):
+        # header plus the data in 16 byte blocks
+        return 16 + 16 * ((len(value) + 16) // 16)
+    if isinstance(value, float):
+        return 16
+    # small ints, bools and None do not use the heap
+    return 0
+
+def lineSignature(verbosity, line):
+    # Identifies a response line; the length and CRC32, or the line itself if
+    # there is no crc32(). hash() is too weak, MicroPython str hashes are 16 bits
+    if crc32 is None:
+        return (verbosity, line)
+    if implementation.name != 'micropython':
+        line = line.encode('utf-8')  # MicroPython str supports the buffer protocol
+    return (verbosity, len(line), crc32(line))
+
+def differs(a, b):
+    # True if merging 'b' into 'a' would change it
+    if isinstance(b, dict):
+        if not isinstance(a, dict):
+            return True
+        for k in b:
+            if differs(a.get(k, None), b[k]):
+                return True
+        return False
+    if isinstance(b, list):
+        if not isinstance(a, list) or len(b) > len(a):
+            return True
+        for x, y in zip(a, b):
+            if differs(x, y):
+                return True
+        return False
+    return b is not None and a != b
+
 def reduce(function, iterable, initializer=None):
     it = iter(iterable)
     if initializer is None:
@@ -86,6 +235,158 @@ class serialOMError(Exception):
     def __str__(self):
         return f'{self.errMsg}'
 
+def decodeRaw(decoder, verbose, frequent=None):
+    # Decode a verbose response line and merge the latest frequent data into it,
+    # a frequent line, or the (already decoded) part of a root level snapshot
+    value = decoder(verbose)['result']
+    if frequent:
+        if isinstance(frequent, str):
+            frequent = decoder(frequent)['result']
+        value = merge(value, frequent)
+    return value
+
+class omModel(dict):
+    '''
+        The local model when lazy keys are used. A normal dictionary, except that
+        keys can be held as their undecoded JSON response lines; these are only
+        decoded, and stored as normal, when the key is first read.
+
+        init arguments:
+            data:       dict; initial model
+            decoder:    function used to decode the JSON lines
+
+        methods:
+            setRaw(key,verbose,frequent):
+                        Stores a key as a verbose response line, or with only
+                        'frequent' set; replaces the frequent data that will be
+                        merged into it when decoded. This is a response line, or
+                        the decoded part of a root level snapshot.
+
+        properties:
+            pending:    dict of keys that are not yet decoded: {key:[verbose,frequent]}
+            decodes:    number of keys decoded on access
+
+        Reading a key with model[key] or model.get(key) decodes it, undecoded keys
+        are 'None' when iterated with items() or values().
+    '''
+    def __init__(self, data, decoder):
+        super().__init__(data)
+        self._decoder = decoder
+        self.pending = {}
+        self.decodes = 0
+
+    def __getitem__(self, key):
+        if key in self.pending:
+            self._decode(key)
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        if key in self.pending:
+            self._decode(key)
+        return super().get(key, default)
+
+    def __setitem__(self, key, value):
+        if key in self.pending:
+            del self.pending[key]
+        super().__setitem__(key, value)
+
+    def setRaw(self, key, verbose=None, frequent=None):
+        if verbose is not None:
+            self.pending[key] = [verbose, frequent]
+            # placeholder, so that 'key in model' still works
+            super().__setitem__(key, None)
+        else:
+            self.pending[key][1] = frequent
+
+    def _decode(self, key):
+        verbose, frequent = self.pending.pop(key)
+        super().__setitem__(key, decodeRaw(self._decoder, verbose, frequent))
+        self.decodes += 1
+
+class omPath:
+    '''
+        A model path, parsed once and then reused for fast lookups.
+
+        init arguments:
+            path:       str; keys seperated by '.', with list indexes in brackets,
+                        '[]' or '[*]' matches any list entry, eg:
+                          'boards[0].vIn.current', 'heat.heaters[].current'
+
+        methods:
+            get(model,*indexes,default=None):
+                        Returns the value at the path, or 'default' if it is not in
+                        the model. Any '[]' steps take their index from 'indexes', eg:
+                          omPath('heat.heaters[].current').get(OM.model, 1)
+            walk(model):
+                        Generator returning (labels,value) for every value matching
+                        the path, 'labels' is a tuple of (listName,index) pairs for
+                        the '[]' and numbered list steps.
+            expand(model):
+                        Generator returning (path,value) for every value matching
+                        the path, with the actual indexes in 'path', eg:
+                          ('heat.heaters[1].current',280.2)
+
+        properties:
+            path:       The path string
+            steps:      List of dict keys (str), list indexes (int) and '*' for '[]'
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.steps = []
+        for part in path.split('.'):
+            name = part.split('[')[0]
+            if name:
+                self.steps.append(name)
+            for index in part.split('[')[1:]:
+                index = index.rstrip(']')
+                self.steps.append('*' if index in ('*','') else int(index))
+
+    def get(self, model, *indexes, default=None):
+        node = model
+        i = 0
+        try:
+            for step in self.steps:
+                if step == '*':
+                    step = indexes[i]
+                    i += 1
+                node = node[step]
+        except (KeyError, IndexError, TypeError):
+            return default
+        return node
+
+    def walk(self, model):
+        return self._walk(model, 0, (), None)
+
+    def expand(self, model):
+        for labels, value in self.walk(model):
+            indexes = [index for name, index in labels]
+            path = ''
+            for step in self.steps:
+                if isinstance(step, str) and step != '*':
+                    path += ('.' if path else '') + step
+                else:
+                    path += '[' + str(indexes.pop(0)) + ']'
+            yield path, value
+
+    def _walk(self, node, first, labels, name):
+        # 'name' is the last dict key seen, lists are labelled with it
+        for n in range(first, len(self.steps)):
+            step = self.steps[n]
+            try:
+                if step == '*':
+                    for index, item in enumerate(node):
+                        yield from self._walk(item, n + 1, labels + ((name, index),), name)
+                    return
+                node = node[step]
+            except (KeyError, IndexError, TypeError):
+                return
+            if isinstance(step, int):
+                labels += ((name, step),)
+            else:
+                name = step
+        yield labels, node
+
+
 class serialOM:
     '''
         Object Model communications class.
@@ -119,26 +420,136 @@ class serialOM:
             rawLog:         file object; where to write the raw log, default: None
             quiet:          bool; suppress messages on startup and when soft errors
                                 are encountered, default: False
+            requestTimeout: int; maximum time (ms) to wait for a response, default: 250
+                                Model requests use a shorter, per-key, timeout learned
+                                from recent response times (see below).
             noCheck:        bool; skip firmware (M115) check during init, default: False
+            cacheFile:      str; filename for a warm-start cache of the model, default: None
+                                When set the model and seqs are saved whenever verbose
+                                data changes, and restored at startup. Keys whose seqs
+                                still match are then only refreshed with frequent requests.
+                                The cache is ignored if the firmware differs, and the
+                                normal restart handling discards it if the controller
+                                uptime has rolled back or the machine mode changed.
+                                It also records when the controller booted (wall clock
+                                time less the uptime); if that has moved by more than
+                                10s the controller has restarted and the cache is
+                                discarded. Hosts without a set clock (eg: MicroPython
+                                boards with no RTC) will discard the cache after they
+                                restart.
+                                The cache also records the controller identity and
+                                capabilities; a known controller is validated with a
+                                single M115 request, and keys it does not have (a null
+                                verbose response) are skipped. They are tried again
+                                after a restart or firmware change, or if noCheck is set.
+
+            profiles:       dict; per-status polling profiles, default: None, see below
+            strategy:       str; how frequent data is fetched, default: 'auto'
+                                'keys'     : seqs, state and each key are requested in turn
+                                'snapshot' : a single root level frequent request returns
+                                             the seqs, state and all keys, which are split
+                                             into the model. Verbose requests are only made
+                                             for keys whose seqs changed.
+                                'auto'     : uses the measured response times to pick the
+                                             cheaper, trying the other every 50 updates.
+                                             Until measured the snapshot is used for 3 or
+                                             more keys.
+            decoder:        str; JSON decoder for responses, default: 'auto'
+                                'auto'     : orjson or ujson if installed, otherwise json
+                                'json'     : the standard library json module
+                                'stream'   : MicroPython UARTs only; responses are decoded
+                                             directly from the UART by json.load(), the
+                                             response line is never held in memory
+                                or a function that takes a string and returns the data
+            lazyKeys:       list; keys whose verbose responses are stored undecoded, and
+                                only decoded when first read from the model, default: None
+                                Use for large keys where only a few values are used, or
+                                which are rarely read. The model becomes an omModel; a
+                                dict subclass that decodes these keys on access.
+            internKeys:     bool; identical key strings in verbose responses share a
+                                single object across responses, default: False
+                                With the CPython json module keys are shared as they
+                                are decoded, other decoders need a pass over each
+                                verbose response afterwards (orjson already shares
+                                keys, so nothing is done). The saving has not been
+                                measured on MicroPython.
+            fields:         dict; the fields to store for each key, default: None (all)
+                                fields = {'OMkey':['path',..],etc..}
+                                Paths are relative to the key, with '[]' for all list
+                                entries, eg: {'heat':['heaters[].current','bedHeaters']}.
+                                Only the listed fields are kept, paths starting with
+                                '-' are removed instead; eg: {'move':['-axes[].drivers']}.
+                                Applied to both verbose and frequent responses, but
+                                not to lazy keys. omTracker reports use this format.
 
             Specifying the data to fetch:
                 omKeys = {'machineMode':['OMkey1','OMkey2',..],etc..}
                          Empty lists [] are allowed.
                          At least one machineMode must be specified.
 
+            Polling profiles, keyed by 'state.status', change the keys and interval:
+                profiles = {'status':{'keys':{'machineMode':['OMkey1',..],etc..},
+                                      'interval':ms},etc..}
+                         'keys' can be a per-mode dict like omKeys, or a single list
+                         used for all modes. It is optional, the omKeys are used for
+                         statuses without a profile or if 'keys' is not given.
+                         'interval' (ms) is optional, it is not used by serialOM but
+                         is made available to the calling program as self.interval.
+                eg: profiles = {'off':{'keys':['boards'],'interval':10000},
+                                'idle':{'keys':{'FFF':['heat','tools','boards']}}}
+                The profile changes as soon as a new status is seen, keys that are
+                dropped by the new profile are refreshed one last time.
+
         methods:
             sendGcode(code):         Sends a Gcode to controller and returns immediately.
-            getResponse(code,json):  Sends a Gcode and waits for a response.
+            registerGcode(code):     Pre-encodes a frequently sent Gcode for sendGcode()
+                                     and getResponse(), avoiding per-call allocations.
+            getResponse(code,json,timeout):
+                                     Sends a Gcode and waits for a response.
                                      If 'json' is True it will exit as soon as a json
                                      line is seen, and only returns that line.
                                      Otherwise returns the response as a list of lines until
                                      the read timeout. No response returns an empty list
-            update():                Updates local model from the controller
+                                     'timeout' is optional, default is the requestTimeout
+            update(budget):          Updates local model from the controller
                                      Returns True for success, False if timeouts occurred
+                                     'budget' is an optional time limit (ms), keys that do
+                                     not fit are deferred to the next update
+            saveCache():             Saves the warm-start cache now (if a cacheFile is set)
+            memoryReport():          Returns the approximate memory used (bytes) by each top
+                                     level key of the model, plus the 'total'
+            reconnect(rrf):          Resumes comms after an error, keeping the local model,
+                                     'rrf' is an optional replacement serial/UART object.
+                                     Returns True if the controller responded
 
         properties:
-            msdel:              Dictionary with the fetched model
+            model:              Dictionary with the fetched model
             machineMode:        The current machine mode, string, or None if no response
+            skipped:            List of keys deferred by the last budgeted update()
+            interval:           Poll interval (ms) requested by the current profile, or None
+            strategy:           The strategy used by the last update(); 'keys' or 'snapshot'
+            versions:           Dictionary with a version number for each top level key,
+                                  incremented whenever the key's content changes.
+            version:            Model version, incremented once by each update() that
+                                  changed any key.
+            changed:            List of the keys that changed in the last update()
+            indexes:            Lookup tables for tools, tool heaters, axes and the bed and
+                                  chamber heaters, rebuilt only when their keys change.
+            decoder:            Name of the JSON decoder in use
+            firmware:           Dictionary with the controller identity from M115; 'name',
+                                  'version', 'board' and 'date'. Empty if not checked.
+            stats:              Dictionary of request counters and timings (ms):
+                                  'requests', 'timeouts', 'latencyLast', 'latencyMax',
+                                  'latencySum'; latency is measured from sending the
+                                  request to the first response line.
+                                  'breakers' is a dict of consecutive failures for
+                                  failing keys, 'breakerSkips' counts requests skipped
+                                  while a key's breaker was open.
+                                  'flushed' counts stale bytes discarded from the recieve
+                                  buffer before requests, 'stale' counts out of sequence
+                                  replies (for another key or verbosity) that were ignored.
+                                  'cacheHits' counts responses that were identical to the
+                                  last one stored for the key, and were not decoded.
 
         There are a few defaults set below, of note are:
             self._requestTimeout : Absolute maximum time to wait for any response, int(ms)
@@ -146,54 +557,164 @@ class serialOM:
                                    total blocking time is the sum total of these
                                    - for a normal update() we always fetch the seqs and state
                                      keys, plus the per mode keys defined in omKeys
+                                   Model requests learn a per-key timeout; 1.5x the slowest of
+                                   the last few responses plus a margin, it is never shorter
+                                   than the time needed to transfer the key's last response
+                                   at the current baud rate, or longer than requestTimeout
+                                   unless that transfer time requires it.
+            self._timeoutMargin  : Added to learned timeouts, int(ms), default: 25
+            self._timingSamples  : Number of response times remembered per key, default: 8
+            self._breakerThreshold : Consecutive failures before a key is 'broken' and
+                                   skipped, default: 3. Broken keys are retried (once) after
+                                   a backoff that starts at self._breakerBackoff (1000ms)
+                                   and doubles on each failed retry, up to
+                                   self._breakerMaxBackoff (64000ms). A good response
+                                   restores the key.
             self._depth          : the maximum depth specified for M409 requests, default = all
             self._uartRxBuf      : microPython specific: UART input buffer size, the default
                                    of 512 bytes is probably OK, but increasing is not a bad idea
     '''
 
-    def __init__(self, rrf, omKeys, rawLog=None, quiet=False, noCheck=False):
+    def __init__(self, rrf, omKeys, rawLog=None, quiet=False, noCheck=False,
+                 cacheFile=None, requestTimeout=250, profiles=None, strategy='auto',
+                 decoder='auto', lazyKeys=None, internKeys=False,
+                 fields=None):
         self._rrf = rrf
         self._uart = False
         self._omKeys = omKeys
+        self._profiles = profiles or {}
+        self._profileKeys = []   # keys used by the last update
+        self._status = None
+        self._strategy = strategy
+        self._snapshotKeys = []   # keys refreshed by the last snapshot
+        self._snapshotMinKeys = 3
+        self._probeCycles = 50
+        self._cycles = 0
         self._rawLog = rawLog
         self._quiet = quiet
         self._noCheck = noCheck
-        self._requestTimeout = 250
+        self._cacheFile = cacheFile
+        self._cacheDirty = False
+        # sizes (bytes) of the last verbose and frequent response for each key,
+        # and keys the controller does not provide
+        self._caps = {'sizes':{}, 'missing':[]}
+        self._requestTimeout = requestTimeout
+        self._timeoutMargin = 25
+        self._timingSamples = 8
+        self._timing = {'v':{}, 'f':{}}
+        self._frames = {'v':{}, 'f':{}}
+        self._framesDepth = None   # the self._depth the frames were built with
+        self._gcodes = {}
+        self._baud = None
         self._depth = 99
         self._uartRxBuf = 2048
+        self._stream = decoder == 'stream'
+        if callable(decoder):
+            self._loads, self.decoder = decoder, 'custom'
+        elif decoder == 'json':
+            self._loads, self.decoder = loads, 'json'
+        else:
+            self._loads, self.decoder = fastLoads, fastDecoder
+        # state and seqs are needed by every update, they are never lazy
+        self._lazyKeys = [key for key in (lazyKeys or []) if key not in ('state','seqs')]
+        # Verbose responses can be decoded with shared key strings; by the
+        # json hook on CPython, or a pass over the decoded response elsewhere.
+        # orjson already shares the key strings of all responses.
+        self._keyTable = None
+        self._loadsVerbose = self._loads
+        if internKeys and self._loads is loads and implementation.name != 'micropython':
+            self._loadsVerbose = internLoads({})
+        elif internKeys and self.decoder != 'orjson':
+            self._keyTable = {}
+        self._fields = {}
+        for key, paths in (fields or {}).items():
+            if paths and key != 'seqs':
+                if key == 'state' and any(p[:1] != '-' for p in paths):
+                    # serialOM needs these
+                    paths = list(paths) + ['status','machineMode','upTime']
+                self._fields[key] = compileFields(paths)
         self._defaultModel = {'state':{'status':'unknown'},'seqs':None}
+        if self._lazyKeys:
+            self._defaultModel = omModel(self._defaultModel, self._loads)
         self._seqKeys = ['state']  # we always check 'state'
         for mode in self._omKeys.keys():  # all possible keys
             self._seqKeys = list(set(self._seqKeys) | set(self._omKeys[mode]))
+        for profile in self._profiles.values():
+            for mode in self._omKeys.keys():
+                self._seqKeys = list(set(self._seqKeys) | set(self._keysFor(profile, mode)))
         self._seqs = {}
         for key in self._seqKeys:
             self._seqs[key] = -1
         self._upTime = -1
+        self._bootTime = None   # controller boot time (wall clock) from the cache
+        # pre-build the request frames for all keys
+        for key in self._seqKeys + ['seqs','']:
+            self._frame(key, 'v')
+            self._frame(key, 'f')
+        self._fetched = {}  # ticks_ms() of the last good response for each key
+        self._indexKeys = ('heat','move','tools')
+        self._indexDirty = set(self._indexKeys)
+        self._indexes = {}
+        self._lineHashes = {}  # last stored response per key: lineSignature()
+        self._breakers = {}  # failing keys: {key:[opened ticks_ms(),backoff ms]}
+        self._breakerThreshold = 3
+        self._breakerBackoff = 1000
+        self._breakerMaxBackoff = 64000
 
         # public parameters
         self.model = self._defaultModel
         self.machineMode = ''
+        self.firmware = {}
+        self.skipped = []
+        self.interval = None
+        self.strategy = None
+        self.versions = {}
+        self.version = 0
+        self.changed = []
+        self.stats = {'requests':0, 'timeouts':0,
+                      'latencyLast':0, 'latencyMax':0, 'latencySum':0,
+                      'breakers':{}, 'breakerSkips':0, 'stale':0, 'flushed':0,
+                      'cacheHits':0}
+        self._latency = None   # ms to the first line of the latest response read, or None
 
         # Main Init
         self._print('serialOM is starting')
 
+        # set the serial device timeouts
+        self._setTimeouts()
+        if self._stream:
+            if self._uart:
+                self.decoder = 'stream'
+            else:
+                self._print('stream decoding needs a MicroPython UART, using ' + self.decoder)
+                self._stream = False
+        # start the handler
+        self._start()
+
+    def _setTimeouts(self):
         # set a non blocking timeout on the serial device
         # default is 1/10 of the request time
+        rrf = self._rrf
+        self._baud = None
         if 'Serial' in str(type(rrf)):
             # PySerial, set the values
             rrf.timeout = self._requestTimeout / 10000
             rrf.write_timeout = rrf.timeout
+            self._baud = rrf.baudrate
         elif 'UART' in str(type(rrf)):
             # UART (micropython), call init again to update timeouts
             self._uart = True
+            # the baud rate is only available via repr(): 'UART(0, baudrate=57600, ..'
+            try:
+                self._baud = int(repr(rrf).split('baudrate=')[1].split(',')[0])
+            except:
+                pass
             rrf.init(timeout = int(self._requestTimeout / 10),
                      timeout_char = int(self._requestTimeout / 10),
                      rxbuf = self._uartRxBuf)
         else:
             self._print('Unable to determine serial stream type to enforce read timeouts!')
             self._print('please ensure these are set for your device to prevent serialOM blocking')
-        # start the handler
-        self._start()
 
     def _print(self, *args, **kwargs):
         # To print, or not print, that is the question.
@@ -202,8 +723,16 @@ class serialOM:
 
     def _start(self):
         # Start the serialOM comms
+        cache = None
+        if self._cacheFile:
+            cache = self._readCache()
         if self._noCheck:
             self._print('skipping controller check')
+            sleep_ms(100)
+        elif (cache and cache['identity'] and self._firmwareRequest()
+              and self.firmware == cache['identity']):
+            # A single good response from a known controller is enough
+            self._print('controller is known, skipping probe')
         else:
             retries = 10
             while not self._firmwareRequest():
@@ -214,7 +743,9 @@ class serialOM:
                 self._print('failed..retrying (' + str(retries) + ' left)')
                 sleep_ms(self._requestTimeout)
             self._print('controller is connected')
-        sleep_ms(100)
+            sleep_ms(100)
+        if cache:
+            self._restoreCache(cache)
         # Do initial update to fill local model`
         self._print('making initial data set request')
         if self.update():
@@ -226,113 +757,476 @@ class serialOM:
             self._print('failed to obtain initial machine state')
             return False
 
-    def _omRequest(self, OMkey, OMflags):
+    def _readCache(self):
+        # Read the warm-start cache, returns None if not available
+        try:
+            with open(self._cacheFile, 'r') as f:
+                return load(f)
+        except Exception as e:
+            self._print('no usable model cache: ' + repr(e))
+            return None
+
+    def _restoreCache(self, cache):
+        # Restore the model, seqs and capabilities from the warm-start cache
+        if self.firmware and cache['identity'] != self.firmware:
+            self._print('model cache is for different firmware, ignoring')
+            return False
+        self._caps = cache['caps']
+        if not self.firmware:
+            # unchecked (noCheck), the firmware may have changed
+            self._forgetMissing()
+        # Restore into the existing model so that clean restarts behave as normal
+        self.model.update(cache['model'])
+        for key, (verbose, frequent) in cache.get('lazy', {}).items():
+            if isinstance(self.model, omModel):
+                self.model.setRaw(key, verbose, frequent)
+            else:
+                self.model[key] = decodeRaw(self._loads, verbose, frequent)
+        self._lineHashes = {}
+        self._indexDirty = set(self._indexKeys)
+        for key in self._seqKeys:
+            if key in cache['seqs']:
+                self._seqs[key] = cache['seqs'][key]
+        self._upTime = cache['upTime']
+        self._bootTime = cache.get('boot')
+        self.machineMode = cache['machineMode']
+        for key in cache['model']:
+            self._changedKey(key)
+        for key in cache.get('lazy', {}):
+            self._changedKey(key)
+        self._print('model restored from cache')
+        return True
+
+    def saveCache(self):
+        '''
+            Writes the model, seqs, uptime, mode, firmware identity and
+            capabilities to the cacheFile in compact JSON, via a temporary
+            file so a partial write is never loaded.
+        '''
+        if not self._cacheFile:
+            return False
+        cache = {'identity':self.firmware, 'caps':self._caps,
+                 'machineMode':self.machineMode, 'upTime':self._upTime,
+                 'boot':int(time()) - self._upTime,
+                 'seqs':self._seqs, 'model':self.model}
+        if isinstance(self.model, omModel) and self.model.pending:
+            # undecoded keys are saved as their response lines
+            pending = self.model.pending
+            cache['model'] = {k:v for k,v in self.model.items() if k not in pending}
+            cache['lazy'] = pending
+        try:
+            with open(self._cacheFile + '.tmp', 'w') as f:
+                f.write(dumps(cache, separators=(',',':')))
+            rename(self._cacheFile + '.tmp', self._cacheFile)
+        except Exception as e:
+            self._print('failed to save model cache: ' + repr(e))
+            return False
+        self._cacheDirty = False
+        return True
+
+    @property
+    def indexes(self):
+        '''
+            Lookup tables for code with access to the serialOM object, rebuilt
+            (when read) only after verbose data for the 'heat', 'move' or 'tools'
+            keys has changed:
+              'tools':         {toolNumber:index in tools}
+              'toolHeaters':   {toolNumber:[heater numbers]}
+              'axes':          {axisLetter:index in move.axes}
+              'bedHeater':     first bed heater number, or -1
+              'chamberHeater': first chamber heater number, or -1
+        '''
+        if self._indexDirty:
+            for key in self._indexDirty:
+                self._buildIndex(key)
+            self._indexDirty = set()
+        return self._indexes
+
+    def _buildIndex(self, key):
+        # (Re)build the lookup tables from a key
+        indexes = self._indexes
+        value = self.model.get(key)
+        try:
+            if key == 'tools':
+                indexes['tools'] = {}
+                indexes['toolHeaters'] = {}
+                for index, tool in enumerate(value or []):
+                    if tool is not None:
+                        # tools are listed by number, 'number' may have been pruned
+                        number = tool.get('number', index)
+                        indexes['tools'][number] = index
+                        indexes['toolHeaters'][number] = list(tool.get('heaters', []))
+            elif key == 'move':
+                indexes['axes'] = {}
+                for index, axis in enumerate(value['axes'] if value else []):
+                    indexes['axes'][axis['letter']] = index
+            elif key == 'heat':
+                for name in ('bed','chamber'):
+                    heaters = value.get(name + 'Heaters', []) if value else []
+                    indexes[name + 'Heater'] = heaters[0] if heaters else -1
+        except (KeyError, IndexError, TypeError):
+            self._print('unable to index the "' + key + '" key')
+
+    def memoryReport(self):
+        '''
+            Returns the approximate memory (bytes) used by each top level key of
+            the model, plus a 'total'. Uses sys.getsizeof() on CPython, on
+            MicroPython the heap use is estimated. Objects that appear more
+            than once are only counted once. Undecoded lazy keys are
+            reported as the size of their response lines.
+        '''
+        seen = set()
+        report = {}
+        pending = getattr(self.model, 'pending', {})
+        for key, value in self.model.items():
+            if key in pending:
+                value = pending[key]
+            report[key] = sizeOf(value, seen)
+        report['total'] = sum(report.values())
+        return report
+
+    def _frame(self, OMkey, verbosity):
+        # The encoded M409 request for a key, built once and then reused
+        # until self._depth is changed
+        if self._framesDepth != self._depth:
+            self._frames = {'v':{}, 'f':{}}
+            self._framesDepth = self._depth
+        frames = self._frames[verbosity]
+        if OMkey not in frames:
+            cmd = 'M409 F"' + verbosity + 'nd' + str(self._depth) + '"'
+            if OMkey:
+                cmd += ' K"' + OMkey + '"'
+            frames[OMkey] = bytes(cmd + '\r\n', 'utf-8')
+        return frames[OMkey]
+
+    def _omRequest(self, OMkey, verbosity, wanted=None):
         '''
             This is the main request send/recieve function, it sends a OM key request to the
             controller and returns True when a valid response was recieved, False otherwise.
+            'verbosity' is 'v' or 'f', an empty OMkey requests a root level snapshot, this
+            is split into the 'wanted' keys.
         '''
-        # Construct the M409 command
-        cmd = 'M409 F"' + OMflags + '" K"' + OMkey + '"'
-        queryResponse = self.getResponse(cmd, json=True)
-        if len(queryResponse) == 0:
-            return False
-        else:
-            return self._updateOM(queryResponse,OMkey)
+        def receive():
+            # read and store the response, returns (anything recieved, good response)
+            self._latency = None
+            if self._stream:
+                payload = self._streamResponse(requestTime, timeout)
+                if payload is None:
+                    return False, False
+                return True, payload is not False and self._storePayload(payload, OMkey, verbosity, wanted)
+            queryResponse = self._readResponse(requestTime, timeout, json=True)
+            if len(queryResponse) == 0:
+                return False, False
+            return True, self._updateOM(queryResponse, OMkey, verbosity, wanted)
 
-    def _updateOM(self,response,OMkey):
-        # Merge or replace the local OM copy with results from the query
+        timeout = self._keyTimeout(OMkey, verbosity)
+        self._flushInput()
+        self.sendGcode(self._frame(OMkey, verbosity))
+        requestTime = ticks_ms()
+        received, good = receive()
+        # If only stale replies were seen keep reading for ours, within the timeout
+        while not good and received and ticks_diff(ticks_ms(),requestTime) < timeout:
+            received, good = receive()
+        self._requestStats(self._latency if received else None, True)
+        # remember the response time, or the timeout so that we back off after a failure
+        timing = self._timing[verbosity]
+        if OMkey not in timing:
+            timing[OMkey] = []
+        samples = timing[OMkey]
+        samples.append(self._latency if good else timeout)
+        if len(samples) > self._timingSamples:
+            samples.pop(0)
+        return good
+
+    def _keyTimeout(self, key, verbosity):
+        # Derive a request timeout from recent response times for this key,
+        # never less than the time needed to transfer the expected response
+        floor = self._timeoutMargin
+        size = self._caps['sizes'].get(key, {}).get(verbosity)
+        if size and self._baud:
+            floor += int(size * 10000 / self._baud)  # 10 bits per byte, in ms
+        ceiling = max(self._requestTimeout, floor)
+        samples = self._timing[verbosity].get(key)
+        if not samples:
+            return ceiling
+        return min(max(int(max(samples) * 1.5) + self._timeoutMargin, floor), ceiling)
 
-        def merge(a, b):
-            # A Local function for recursive/iterative merge of dict/list structures.
-            # https://stackoverflow.com/questions/19378143/python-merging-two-arbitrary-data-structures#1
-            if isinstance(a, dict) and isinstance(b, dict):
-                d = dict(a)
-                d.update({k: merge(a.get(k, None), b[k]) for k in b})
-                return d
-            if isinstance(a, list) and isinstance(b, list):
-                return [merge(x, y) for x, y in zip_longest(a, b)]
-            return a if b is None else b
+    def _updateOM(self,response,OMkey,verbosity,wanted=None):
+        # Merge or replace the local OM copy with results from the query
+        # replies for any other key or verbosity are stale, and discarded
+        # 'wanted' is the list of keys to take from a root level (snapshot) response
 
         # Process Json candidate lines
         ownKey = False
         for line in response:
+            # A response identical to the last one stored for this key needs
+            # no decoding or merging, the model already holds it
+            signature = lineSignature(verbosity, line)
+            if OMkey and self._lineHashes.get(OMkey) == signature:
+                ownKey = True
+                self.stats['cacheHits'] += 1
+                if verbosity == 'v' and OMkey in self._seqKeys:
+                    self._seqs[OMkey] = self.model['seqs'][OMkey]
+                continue
+            # Lazy keys are stored undecoded, until they are read
+            if OMkey in self._lazyKeys and self._lazyStore(line,OMkey,verbosity):
+                ownKey = True
+                self._lineHashes[OMkey] = signature
+                continue
             # Load as a json data structure
             try:
-                payload = loads(line)
+                payload = self._loadsVerbose(line) if verbosity == 'v' else self._loads(line)
             except:
                 self._print('invalid JSON recieved')
                 continue
-            # Update local OM data
-            if 'seq' in payload.keys():
-                # json info messages, currently ignored, string in payload['resp']
-                continue
-            if 'key' not in payload.keys():
-                self._print('valid JSON recieved, but no "key" data in it')
-                continue
-            elif 'result' not in payload.keys():
-                self._print('valid JSON recieved, but no "result" data in it')
-                continue
-            elif payload['key'] != OMkey:
-                self._print('out of sequence response')
-            else:
+            if self._storePayload(payload,OMkey,verbosity,wanted,len(line)):
                 ownKey = True
-            # We have a result, store it (even if not for 'our' key)
-            if 'f' in payload['flags']:
+                if OMkey:
+                    self._lineHashes[OMkey] = signature
+        return ownKey
+
+    def _lazyStore(self,line,OMkey,verbosity):
+        # Store a response line for a lazy key without decoding it. Returns False if the
+        # line needs decoding; not the expected response, a missing key, or a frequent
+        # response for a key that has already been decoded (it is merged as normal)
+        if (not line.startswith('{"key":"' + OMkey + '","flags":"' + verbosity)
+            or line.endswith('"result":null}\n')):
+            return False
+        if verbosity == 'v':
+            self.model.setRaw(OMkey, line)
+            self._changedKey(OMkey)
+            if OMkey in self._indexKeys:
+                self._indexDirty.add(OMkey)
+            if OMkey in self._seqKeys:
+                self._seqs[OMkey] = self.model['seqs'][OMkey]
+                self._cacheDirty = True
+        elif OMkey in self.model.pending:
+            self.model.setRaw(OMkey, frequent=line)
+            self._changedKey(OMkey)
+        else:
+            return False
+        self._caps['sizes'].setdefault(OMkey, {})[verbosity] = len(line)
+        return True
+
+    def _storePayload(self,payload,OMkey,verbosity,wanted=None,size=None):
+        # Store a decoded response in the local OM, returns True if it was for OMkey
+        if not isinstance(payload, dict):
+            self._print('valid JSON recieved, but not an object')
+            return False
+        # Update local OM data
+        if 'seq' in payload.keys():
+            # json info messages, currently ignored, string in payload['resp']
+            return False
+        if 'key' not in payload.keys():
+            self._print('valid JSON recieved, but no "key" data in it')
+            return False
+        elif 'result' not in payload.keys():
+            self._print('valid JSON recieved, but no "result" data in it')
+            return False
+        elif payload['key'] != OMkey or payload.get('flags','')[:1] != verbosity:
+            self._print('out of sequence response, discarded')
+            self.stats['stale'] += 1
+            return False
+        # learn about the controller; payload sizes and missing keys
+        # only a verbose null means the key does not exist, frequent requests
+        # can return null for keys that have no frequent values
+        if payload['result'] is None:
+            if verbosity == 'v' and OMkey != '' and OMkey not in self._caps['missing']:
+                self._print('controller has no "' + OMkey + '" key, skipping it')
+                self._caps['missing'].append(OMkey)
+                self._cacheDirty = True
+        elif size:
+            sizes = self._caps['sizes'].setdefault(OMkey, {})
+            sizes[verbosity] = size
+        if OMkey == '':
+            # A root level snapshot; split it into the keys we want, taking
+            # the seqs first so we know which keys need a verbose refresh.
+            if wanted is None or not isinstance(payload['result'], dict):
+                return True
+            result = payload['result']
+            self._snapshotKeys = []
+            if 'seqs' in result:
+                if self.model['seqs'] != result['seqs']:
+                    self._changedKey('seqs')
+                self.model['seqs'] = result['seqs']
+                self._snapshotKeys.append('seqs')
+            parts = []
+            for key in wanted:
+                if key in result and self._keyVerbosity(key) == 'f':
+                    parts.append((key, result[key]))
+                    self._snapshotKeys.append(key)
+                    self._lineHashes.pop(key, None)
+        else:
+            parts = [(OMkey, payload['result'])]
+        # We have a result for our key, store it
+        for key, result in parts:
+            if result is None:
+                continue
+            if key in self._fields:
+                result = prune(result, *self._fields[key])
+            if verbosity == 'f' and isinstance(self.model, omModel) and key in self.model.pending:
+                # a snapshot part for an undecoded lazy key is kept until it is read
+                self.model.setRaw(key, frequent=result)
+                self._changedKey(key)
+            elif verbosity == 'f':
                 # Frequent updates just refresh the existing key as needed
-                if payload['result'] != None:
-                    #debug print('+',end='')
-                    self.model[payload['key']] = merge(self.model[payload['key']],payload['result'])
+                #debug print('+',end='')
+                if differs(self.model.get(key), result):
+                    self._changedKey(key)
+                self.model[key] = merge(self.model[key],result)
             else:
                 # Verbose output simply replaces the existing key
-                if payload['result'] != None:
-                    #debug print('*',end='')
-                    self.model[payload['key']] = payload['result']
-                    if payload['key'] in self._seqKeys:
-                        self._seqs[payload['key']] = self.model['seqs'][payload['key']]
-            # always gc if OM updated
-            collect()
-        return ownKey
+                #debug print('*',end='')
+                if self._keyTable is not None:
+                    result = internKeys(result, self._keyTable)
+                self.model[key] = result
+                self._changedKey(key)
+                if key in self._indexKeys:
+                    self._indexDirty.add(key)
+                if key in self._seqKeys:
+                    self._seqs[key] = self.model['seqs'][key]
+                    self._cacheDirty = True
+        # always gc if OM updated
+        collect()
+        return True
+
+    def _changedKey(self, key):
+        # Bump the version of a changed key, and the model version once per update
+        self.versions[key] = self.versions.get(key, 0) + 1
+        if not self.changed:
+            self.version += 1
+        if key not in self.changed:
+            self.changed.append(key)
+
+    def _keyVerbosity(self,key):
+        # 'v'erbose if the key's seqs have changed, otherwise 'f'requent
+        if self._seqs[key] != self.model['seqs'].get(key):
+            return 'v'
+        return 'f'
+
+    def _keysFor(self, profile, mode):
+        # The keys a profile uses in a given mode, falls back to the omKeys
+        if profile is None or 'keys' not in profile:
+            return self._omKeys.get(mode, [])
+        if isinstance(profile['keys'], dict):
+            return profile['keys'].get(mode, self._omKeys.get(mode, []))
+        return profile['keys']
+
+    def _breakerOpen(self,key):
+        # True while a failing key is in it's backoff period
+        if key not in self._breakers:
+            return False
+        opened, backoff = self._breakers[key]
+        return ticks_diff(ticks_ms(), opened) < backoff
+
+    def _breakerResult(self,key,good):
+        # Track consecutive failures per key, (re)opening the breaker when needed
+        failures = self.stats['breakers']
+        if good:
+            if key in failures:
+                if key in self._breakers:
+                    self._print('key "' + key + '" is responding again')
+                    del self._breakers[key]
+                del failures[key]
+            return
+        failures[key] = failures.get(key, 0) + 1
+        if failures[key] >= self._breakerThreshold:
+            # exponential backoff; the first retry after the base backoff
+            backoff = self._breakerBackoff << min(failures[key] - self._breakerThreshold, 16)
+            backoff = min(backoff, self._breakerMaxBackoff)
+            self._breakers[key] = [ticks_ms(), backoff]
+            self._print('key "' + key + '" is failing, retrying in ' + str(backoff) + 'ms')
 
     def _keyRequest(self,key):
         # Do an individual key request using the correct verbosity
-        if self._seqs[key] != self.model['seqs'][key]:
-            if self._omRequest(key,'vnd' + str(self._depth)):
-                return True;
-        else:
-            if self._omRequest(key,'fnd' + str(self._depth)):
-                return True;
+        if self._omRequest(key,self._keyVerbosity(key)):
+            self._fetched[key] = ticks_ms()
+            return True;
         return False
 
-    def _stateRequest(self):
-        # sends a state request
+    def _stateRequest(self, fetched=False):
+        # sends a state request, unless 'fetched' by a snapshot
         # handles machine mode and uptime changes
 
         def cleanstart(why):
             # clean and reset the local OM and seqs, returns full seqs list
             self.model = self._defaultModel
+            self._lineHashes = {}
             self._seqs = {}
             for key in self._seqKeys:
                 self._seqs[key] = -1
+            # the restart may have been a firmware update, try missing keys again
+            self._forgetMissing()
             self._print(why)
             return self._seqKeys
 
-        if not self._keyRequest('state'):
+        if not fetched and not self._keyRequest('state'):
             self._print('state key request failed')
             return False
         if self._upTime > self.model['state']['upTime']:
             cleanstart('controller restarted')
+        elif self._bootTime is not None:
+            # the cached uptime can be old, compare when the controller booted
+            if abs(int(time()) - self.model['state']['upTime'] - self._bootTime) > 10:
+                cleanstart('controller restarted since the cache was saved')
+        self._bootTime = None
         if self.machineMode != self.model['state']['machineMode']:
             cleanstart('machine mode is: ' + self.model['state']['machineMode'])
         self.machineMode = self.model['state']['machineMode']
         self._upTime = self.model['state']['upTime']
         return True
 
+    def _snapshotRequest(self, keys):
+        # Fetch the seqs, state and all frequent key data in a single root level request
+        # keys needing a verbose refresh are left for the caller, returns the keys refreshed
+        self._snapshotKeys = []
+        if not self._omRequest('', 'f', ['state'] + keys):
+            self._print('snapshot request failed')
+            return None
+        if 'seqs' not in self._snapshotKeys and not self._seqRequest():
+            return None
+        now = ticks_ms()
+        for key in self._snapshotKeys:
+            self._fetched[key] = now
+        return self._snapshotKeys
+
+    def _useSnapshot(self, keys, budget=None):
+        # Decide on the update strategy; one root level snapshot or per-key requests
+        # with a budget 'auto' only uses the snapshot when it is expected to fit
+        if self._strategy != 'auto':
+            return self._strategy == 'snapshot'
+        self._cycles += 1
+        def cost(key, verbosity):
+            # mean response time for a request, None if not measured, plus the
+            # serial read timeout that ends every request
+            samples = self._timing[verbosity].get(key)
+            if not samples:
+                return None
+            return sum(samples) / len(samples) + self._requestTimeout / 10
+        snapshot = cost('', 'f')
+        perKey = [cost('seqs', 'v')] + [cost(key, 'f') for key in ['state'] + keys]
+        if snapshot is not None and None not in perKey:
+            useSnapshot = snapshot < sum(perKey)
+        elif snapshot is None and None not in perKey:
+            # measure the snapshot once we know the per-key cost
+            useSnapshot = True
+        else:
+            # not measured; the snapshot saves a round trip per key
+            useSnapshot = len(keys) >= self._snapshotMinKeys
+        if self._cycles % self._probeCycles == 0:
+            # occasionally try the other strategy to keep it's timing current
+            useSnapshot = not useSnapshot
+        if useSnapshot and budget is not None and self._keyTimeout('', 'f') > budget:
+            # the per-key requests can be cut short to fit the budget, a snapshot cannot
+            useSnapshot = False
+        return useSnapshot
+
     def _seqRequest(self):
         # Send a 'seqs' request to the OM, updates local OM and returns
         # a list of keys where the sequence number has changed
         changed=[]
         # get the seqs key directly
-        if not self._omRequest('seqs','vnd99'):
+        if not self._omRequest('seqs','v'):
             self._print('sequence key request failed')
             return False
         return True
@@ -359,29 +1253,161 @@ class serialOM:
                 # - Ideally expand to add more checks, eg version.
                 if 'RepRapFirmware' in line:
                     haveRRF = True
+                    identity = self._parseFirmware(fwLine)
+                    if self.firmware and identity != self.firmware:
+                        self._print('controller firmware has changed')
+                        self._forgetMissing()
+                    self.firmware = identity
         return haveRRF
 
+    def _forgetMissing(self):
+        # keys the controller did not have are requested again
+        if self._caps['missing']:
+            self._caps['missing'] = []
+            self._cacheDirty = True
+
+    def _parseFirmware(self, line):
+        # Split a M115 response into a dict of it's identity fields, eg:
+        # FIRMWARE_NAME: RepRapFirmware for Duet 2 WiFi/Ethernet FIRMWARE_VERSION: 3.4.6
+        #   ELECTRONICS: Duet WiFi 1.02 or later FIRMWARE_DATE: 2023-07-21 14:08:28
+        fields = {'FIRMWARE_NAME:':'name', 'FIRMWARE_VERSION:':'version',
+                  'ELECTRONICS:':'board', 'FIRMWARE_DATE:':'date'}
+        identity = {}
+        field = None
+        for word in line.strip().split(' '):
+            if word in fields:
+                field = fields[word]
+                identity[field] = ''
+            elif field:
+                identity[field] = (identity[field] + ' ' + word).strip()
+        return identity
+
+    def registerGcode(self, code):
+        '''
+            Pre-encodes a frequently sent gcode, sendGcode() and getResponse()
+            will then send it without allocating a new buffer each time.
+        '''
+        self._gcodes[code] = bytes(code + "\r\n",'utf-8')
+
     def sendGcode(self, code):
-        # send a gcode
+        # send a gcode, 'code' can also be a complete pre-encoded frame (bytes)
+        if isinstance(code, bytes):
+            frame = code
+        elif code in self._gcodes:
+            frame = self._gcodes[code]
+        else:
+            frame = bytes(code + "\r\n",'utf-8')
         try:
-            self._rrf.write(bytearray(code + "\r\n",'utf-8'))
+            self._rrf.write(frame)
         except Exception as e:
             raise serialOMError('Gcode serial write failed : ' + repr(e)) from None
         # log what we sent
         if self._rawLog:
-            self._rawLog.write("> " + code + "\n")
+            self._rawLog.write("> " + frame.decode('utf-8').strip() + "\n")
 
-    def getResponse(self, cmd, json=False):
+    def _flushInput(self):
+        # Discard anything waiting in the recieve buffer before a request,
+        # eg the late reply to a request that timed out, or unsolicited output
+        flushed = 0
+        try:
+            if self._uart:
+                while self._rrf.any():
+                    data = self._rrf.read(self._rrf.any())
+                    flushed += len(data) if data else 0
+            elif hasattr(self._rrf, 'reset_input_buffer'):
+                flushed = getattr(self._rrf, 'in_waiting', 0)
+                if flushed:
+                    self._rrf.reset_input_buffer()
+        except Exception as e:
+            raise serialOMError('Serial flush failed : ' + repr(e)) from None
+        if flushed:
+            self.stats['flushed'] += flushed
+            if self._rawLog:
+                self._rawLog.write('# flushed ' + str(flushed) + ' bytes\n')
+
+    def getResponse(self, cmd, json=False, timeout=None):
         '''
             Sends a query and waits for response data,
             returns a list of response lines, or None
             If 'json' is set we exit immediately when
             a potential JSON canidate is seen.
+            'timeout' (ms) defaults to the requestTimeout
         '''
+        if timeout is None:
+            timeout = self._requestTimeout
+        # Discard stale input, then send the command to RRF
+        self._flushInput()
+        self.sendGcode(cmd)
+        requestTime = ticks_ms()
+        self._latency = None
+        # And wait for a response
+        response = self._readResponse(requestTime, timeout, json)
+        self._requestStats(self._latency if response else None, json)
+        return response
+
+    def _requestStats(self, latency, json):
+        # count a completed request once, however many reads it took; 'latency'
+        # is that of the last read, or None if it timed out
+        stats = self.stats
+        stats['requests'] += 1
+        if latency is None:
+            stats['timeouts'] += 1
+            if json:
+                self._print('timed out waiting for a json response')
+            else:
+                self._print('timed out waiting for a response')
+            return
+        stats['latencyLast'] = latency
+        stats['latencySum'] += latency
+        if latency > stats['latencyMax']:
+            stats['latencyMax'] = latency
+
+    def _streamResponse(self, requestTime, timeout):
+        # MicroPython only; decode a json response directly from the UART without
+        # first collecting it into a line. Returns the payload, None if nothing
+        # arrived within the timeout, or False if the data was not valid JSON.
+        while not self._rrf.any():
+            if ticks_diff(ticks_ms(),requestTime) >= timeout:
+                return None
+            sleep_ms(1)
+        self._latency = ticks_diff(ticks_ms(),requestTime)
+        try:
+            payload = load(self._rrf)
+        except Exception as e:
+            self._print('invalid JSON recieved: ' + repr(e))
+            return False
+        if self._rawLog:
+            self._rawLog.write(dumps(payload) + '\n')
+        # the trailing newline is discarded by the next request's flush
+        collect()
+        return payload
+
+    def _readResponse(self, requestTime, timeout, json=False):
+        # Reads response lines for a request sent at 'requestTime', waiting
+        # until 'timeout' (ms) after that for the first line. Can be called
+        # again to continue reading within the same request window.
+        def overrun():
+            # True once the response has taken longer than the runaway limit,
+            # allowing for the time to transfer the data recieved at the current baud
+            limit = runaway
+            if self._baud:
+                limit += received * 10000 // self._baud
+            return ticks_diff(ticks_ms(),requestTime) > limit
+
         def getLine():
             # Local function to get and decode a line from serial device
+            nonlocal received
             try:
                 rawLine = self._rrf.readline()
+                received += len(rawLine)
+                # PySerial returns partial lines on timeout, slow links can
+                # need several reads to collect a long response line.
+                while rawLine and rawLine[-1:] != b'\n' and not overrun():
+                    more = self._rrf.readline()
+                    if not more:
+                        break
+                    rawLine += more
+                    received += len(more)
             except Exception as e:
                 raise serialOMError('Serial read from controller failed : ' + repr(e)) from None
             if not rawLine:
@@ -395,52 +1421,133 @@ class serialOM:
                 self._rawLog.write(readLine)
             return readLine
 
-        # Send the command to RRF
-        self.sendGcode(cmd)
-        # And wait for a response
-        requestTime = ticks_ms()
+        runaway = 5 * max(timeout, self._requestTimeout)
+        received = 0
         response=[]
         readLine = ''
-        # look for a response within the requestTimeout period
-        while (ticks_diff(ticks_ms(),requestTime) < self._requestTimeout) and not readLine:
+        # look for a response within the timeout period
+        while (ticks_diff(ticks_ms(),requestTime) < timeout) and not readLine:
             readLine = getLine()
+        if readLine:
+            self._latency = ticks_diff(ticks_ms(),requestTime)
         # now read all lines that arrive within the serialTimeout
         while readLine:
             if not json:
                 response.append(readLine)
             elif (readLine[:1] == '{') and (readLine[-2:] == '}\n'):
                 response.append(readLine)
-            if ticks_diff(ticks_ms(),requestTime) > (5 * self._requestTimeout):
+            if overrun():
                 # runaway comms scenario; may indicate controler crash
                 raise serialOMError('Runaway communications; controller in error state?')
                 break
             # see if more data is in the recieve buffer
             readLine = getLine()
-        # cleanup and return
-        if len(response) == 0:
-            if json:
-                self._print('timed out waiting for a json response')
-            else:
-                self._print('timed out waiting for a response')
         # gc after response loop
         collect()
         return response
 
-    def update(self):
-        # Do an update cycle; get new data and update local OM
-        success = True  # track (soft) failures
-        # do a sequence number request update
+    def reconnect(self, rrf=None):
+        '''
+            Resume communications after a serialOMError without restarting.
+            Optionally takes a new (re-opened) serial/UART object to use.
+            The local model and seqs are kept, a single 'seqs' request
+            validates the link; the following update() only makes verbose
+            requests for keys whose seqs changed, or does a full refresh
+            if the controller has restarted or changed mode.
+            Returns True if the controller responded.
+        '''
+        if rrf is not None:
+            self._rrf = rrf
+            self._setTimeouts()
         if not self._seqRequest():
+            self._print('controller did not respond to reconnect')
             return False
+        self._print('reconnected to controller')
+        return True
+
+    def update(self, budget=None):
+        '''
+            Do an update cycle; get new data and update local OM
+            'budget' (ms) optionally limits the time spent; the seqs and state
+            keys are always fetched, the remaining keys are then requested
+            most-stale first while their expected request time fits in the
+            budget. At least one key is requested in every cycle so all keys
+            are eventually refreshed, keys that did not fit are listed in
+            self.skipped and will be first in line for the next update.
+            With the 'auto' strategy a budget only allows the snapshot when its
+            expected time fits, otherwise the keys are requested individually.
+            An explicit 'snapshot' strategy always makes the (single) snapshot
+            request, the budget then only limits the verbose requests after it.
+        '''
+        begin = ticks_ms()
+        success = True  # track (soft) failures
+        self.skipped = []
+        self.changed = []
+        # the snapshot uses the keys from the last update, any others are fetched below
+        fresh = []
+        previous = [key for key in self._profileKeys if key not in self._caps['missing']]
+        if self._useSnapshot(previous, budget):
+            self.strategy = 'snapshot'
+            fresh = self._snapshotRequest(previous)
+            if fresh is None:
+                return False
+        else:
+            self.strategy = 'keys'
+            # do a sequence number request update
+            if not self._seqRequest():
+                return False
         # do a state request (handles restart and mode changes)
-        if not self._stateRequest():
+        if not self._stateRequest('state' in fresh):
             return False
         if self.machineMode not in self._omKeys.keys():
             # should never hit this, but just in case
             self._print('unknown machine mode "' + self.machineMode + '"')
             return False
+        # select the polling profile for the current status
+        status = self.model['state']['status']
+        profile = self._profiles.get(status)
+        profileKeys = self._keysFor(profile, self.machineMode)
+        wanted = list(profileKeys)
+        if status != self._status:
+            if self._profiles:
+                self._print('polling profile for status: ' + status)
+            # give keys that are being dropped a final refresh
+            for key in self._profileKeys:
+                if key not in wanted:
+                    wanted.append(key)
+            self._status = status
+        self._profileKeys = profileKeys
+        self.interval = profile.get('interval') if profile else None
+        keys = []
+        for key in wanted:
+            if key in self._caps['missing']:
+                continue
+            if key in fresh and self._keyVerbosity(key) == 'f':
+                # already refreshed by the snapshot
+                continue
+            if self._breakerOpen(key):
+                # failing key, do not let it slow down the healthy ones
+                self.stats['breakerSkips'] += 1
+                continue
+            keys.append(key)
+        if budget is not None:
+            # most stale first, never fetched keys before all others
+            now = ticks_ms()
+            keys.sort(key=lambda k: -ticks_diff(now, self._fetched[k]) if k in self._fetched else -(1 << 30))
         # do the individual key requests
-        for key in self._omKeys[self.machineMode]:
-            if not self._keyRequest(key):
+        requested = 0
+        for key in keys:
+            if budget is not None and requested > 0:
+                expected = self._keyTimeout(key, self._keyVerbosity(key))
+                if ticks_diff(ticks_ms(), begin) + expected > budget:
+                    self.skipped.append(key)
+                    continue
+            requested += 1
+            good = self._keyRequest(key)
+            self._breakerResult(key, good)
+            if not good:
                 success = False
+        # keep the warm-start cache in step with verbose changes
+        if self._cacheDirty and self._cacheFile:
+            self.saveCache()
         return success